@@ -1,5 +1,8 @@
 import os
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from enum import Enum
 from pathlib import Path
 from typing import List, Optional, Tuple, Dict
@@ -7,21 +10,76 @@ from typing import List, Optional, Tuple, Dict
 from PIL import Image
 from psd2fabric.fabric import Fabric
 
-from server.common.utils import download_file
+from server.common.limits import stage_limits
+from server.common.metrics import observe_stage
+from server.common.utils import download_file, image_hash
 from server.files.uploader import Uploader
 
 folder = os.path.dirname(os.path.abspath(__file__))
 
 
+def _copy(value):
+    """
+    逐层复制 dict 和 list, 其它值原样返回
+    """
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
 class Context:
     oss_client: Uploader = None
     task_uid: str
     task_type: str
+    progress: Dict[str, Dict]  # 各阶段进度, eg: {"ocr": {"status": "done", "cost": 1.2}}
+    labels: Dict[str, str]  # 耗时指标的标签, eg: {"lan_pair": "zh-en", "provider": "ProviderZH_EN"}
 
     def __init__(self, task_uid: str, task_type: str, oss_client: Uploader):
         self.task_uid = task_uid
         self.task_type = task_type
         self.oss_client = oss_client
+        self.progress = {}
+        self.labels = {"lan_pair": "", "provider": ""}
+        # progress 由工作线程更新, 由接口线程读取
+        self.lock = threading.Lock()
+
+    def set_progress(self, name: str, value: Dict):
+        with self.lock:
+            self.progress[name] = value
+
+    def progress_snapshot(self) -> Dict[str, Dict]:
+        """
+        返回 progress 的副本, 可以在其它线程中安全地序列化
+        """
+        with self.lock:
+            return _copy(self.progress)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        记录一个步骤的耗时指标
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            observe_stage(name, time.time() - start_time, **self.labels)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        记录一个处理阶段的状态和耗时
+        """
+        start_time = time.time()
+        self.set_progress(name, {"status": "running", "cost": 0})
+        try:
+            yield
+        except Exception:
+            self.set_progress(name, {"status": "failed", "cost": round(time.time() - start_time, 3)})
+            raise
+        self.set_progress(name, {"status": "done", "cost": round(time.time() - start_time, 3)})
 
 
 class PContext:
@@ -42,6 +100,12 @@ class PContext:
     def set_payload(self, payload: str):
         self.payload = payload
 
+    def stage(self, name: str):
+        return self.task_context.stage(name)
+
+    def timer(self, name: str):
+        return self.task_context.timer(name)
+
 
 class Font(Enum):
     """
@@ -115,10 +179,12 @@ class PicTransOcrBox:
     text: str  # 原始文本
     to_text: str  # 目标文本
     erase_img: Image  # 原图擦除后的背景图片
+    erase_img_url: Optional[str]  # 擦除后的背景图片上传后的链接
     origin_img: Image  # 原始图片
 
     def __init__(self, from_lan: Language) -> None:
         self.from_lan = from_lan
+        self.erase_img_url = None
 
     def rect_width(self):
         return max(self.ocr_box[1][0] - self.ocr_box[0][0], self.ocr_box[2][0] - self.ocr_box[3][0])
@@ -135,6 +201,7 @@ class PicTransImage:
     origin_image_url: str  # 原始图片的url地址
     origin_image_file: str  # 图片本地链接
     origin_image_name: str  # 原始图片文件名称
+    origin_image_hash: str  # 原始图片像素内容的hash
     erase_image: Image  # 擦除后的图片
     erase_image_url: str  # 擦除后图片链接
 
@@ -153,9 +220,22 @@ class PicTransImage:
 
         # 图片预处理
         # url_path = Path(image_url)
-        self.origin_image_file = download_file(image_url, self.context.resource_dir)
-        self.origin_image_name = Path(self.origin_image_file).name
-        self.origin_image = Image.open(self.origin_image_file).convert('RGB')
-
-        self.origin_image_url = context.task_context.oss_client.upload_image(self.origin_image,
-                                                                             f'{uuid.uuid4().hex}.jpg')
+        with context.stage('download'):
+            with context.timer('download'):
+                self.origin_image_file = download_file(image_url, self.context.resource_dir)
+            self.origin_image_name = Path(self.origin_image_file).name
+            with context.timer('decode'):
+                self.origin_image = Image.open(self.origin_image_file).convert('RGB')
+                self.origin_image_hash = image_hash(self.origin_image)
+        self.origin_image_uploaded = False
+
+    def upload_origin(self) -> str:
+        """
+        上传原始图片, 只在需要合成结果时上传一次
+        """
+        if not self.origin_image_uploaded:
+            with stage_limits.slot('upload'), self.context.timer('upload'):
+                self.origin_image_url = self.context.task_context.oss_client.upload_image(self.origin_image,
+                                                                                          f'{uuid.uuid4().hex}.jpg')
+            self.origin_image_uploaded = True
+        return self.origin_image_url
@@ -0,0 +1,95 @@
+"""
+冷启动导入耗时基准
+
+每个模块在独立的子进程中用 python -X importtime 导入, 取多次运行中的最小累计耗时与预算比较,
+同时检查是否提前导入了只在具体阶段才需要的重量级依赖。超出预算或提前导入时返回非 0。
+
+python -m server.bench.import_time
+python -m server.bench.import_time --repeat 5 --budget server.engine=800
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from server.const import ROOT_DIR
+
+# 各模块的冷启动预算(毫秒), 约为实测值的 4~6 倍, 不含解释器自身启动的耗时
+BUDGETS_MS = {
+    'server': 5,
+    'server.const': 5,
+    'server.common.utils': 20,
+    'server.base': 150,
+    'server.engine': 800,
+    'server.task': 1000,
+}
+
+# 只应在对应阶段第一次执行时才导入的依赖
+LAZY_DEPENDENCIES = ('torch', 'paddle', 'paddleocr', 'iopaint', 'sklearn', 'scipy', 'cv2', 'pint', 'volcengine')
+
+
+def import_time(module: str) -> Tuple[float, List[Tuple[str, int]]]:
+    """
+    返回 (累计耗时毫秒, [(导入的模块, 自身耗时微秒)])
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise Exception(f"import failed: {proc.stderr.strip().splitlines()[-1]}")
+
+    # -X importtime 在导入完成时输出, 没有缩进的是顶层导入, 累计耗时已包含其依赖(和父包);
+    # 解释器启动时 site、encodings 等的顶层导入不计入, 只取 module 所在的顶层导入及其之前的依赖
+    block = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        block.append((name.strip(), int(self_us)))
+        if name[1:].startswith(' '):
+            continue
+        if name.strip() == module:
+            return int(cumulative_us) / 1000, block
+        block = []
+    raise Exception(f"{module} not found in -X importtime output")
+
+
+def run(budgets: Dict[str, float], repeat: int, top: int) -> bool:
+    ok = True
+    for module, budget in budgets.items():
+        try:
+            results = [import_time(module) for _ in range(repeat)]
+        except Exception as e:
+            ok = False
+            print(f"FAIL {module:24} {e}")
+            continue
+        cost, imported = min(results, key=lambda r: r[0])
+        eager = sorted({name.split('.')[0] for name, _ in imported} & set(LAZY_DEPENDENCIES))
+
+        status = 'ok' if cost <= budget and not eager else 'FAIL'
+        ok = ok and status == 'ok'
+        print(f"{status:4} {module:24} {cost:8.1f} ms  (budget {budget:.0f} ms)")
+        if eager:
+            print(f"     eager heavy imports: {', '.join(eager)}")
+        for name, self_us in sorted(imported, key=lambda i: -i[1])[:top]:
+            print(f"     {self_us / 1000:8.1f} ms  {name}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import time benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="每个模块导入的次数, 取最小值")
+    parser.add_argument("--top", type=int, default=5, help="输出自身耗时最多的前 N 个模块")
+    parser.add_argument("--budget", action="append", default=[], help="覆盖预算, eg: server.engine=800")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        module, ms = item.split('=')
+        budgets[module] = float(ms)
+
+    sys.exit(0 if run(budgets, args.repeat, args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
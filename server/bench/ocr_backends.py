@@ -0,0 +1,111 @@
+"""
+OCR 后端对比基准
+
+每个后端在独立的子进程中加载模型并识别同一组图片, 比较启动耗时、单张延迟、进程峰值内存,
+并以 paddle 的识别结果为基准计算其他后端的文字一致率
+
+python -m server.bench.ocr_backends
+python -m server.bench.ocr_backends --backends paddle,onnx,onnx-int8 --images ./samples --lan zh
+"""
+import argparse
+import difflib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from server.const import ROOT_DIR
+
+
+def worker(backend: str, images_dir: str, count: int, lan_code: str, repeat: int):
+    """
+    子进程: 输出一行 json 结果
+    """
+    if backend == 'onnx-int8':
+        os.environ['DOOMN_OCR_ONNX_INT8'] = '1'
+        backend = 'onnx'
+
+    from server.base import Language
+    from server.bench.samples import load_images
+    from server.ocr import local_ocr
+
+    images = load_images(images_dir, count)
+    lan = Language.from_tran(lan_code)
+
+    start = time.perf_counter()
+    ocr_tool = local_ocr([lan], backend)
+    ocr_tool.warmup(lan)
+    startup = time.perf_counter() - start
+
+    costs, texts = [], []
+    for _ in range(repeat):
+        texts = []
+        for image in images:
+            start = time.perf_counter()
+            boxes = ocr_tool.ocr(image, lan)
+            costs.append(time.perf_counter() - start)
+            texts.append([box.text for box in boxes])
+
+    costs.sort()
+    print(json.dumps({
+        "startup_ms": startup * 1000,
+        "p50_ms": costs[len(costs) // 2] * 1000,
+        "p90_ms": costs[int(len(costs) * 0.9)] * 1000,
+        # linux 上单位为 KB
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "texts": texts,
+    }))
+
+
+def run_backend(backend: str, args) -> Dict:
+    cmd = [sys.executable, '-m', 'server.bench.ocr_backends', '--worker', backend,
+           '--count', str(args.count), '--lan', args.lan, '--repeat', str(args.repeat)]
+    if args.images:
+        cmd += ['--images', args.images]
+    proc = subprocess.run(cmd, cwd=ROOT_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise Exception(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed')
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def agreement(expected: List[List[str]], actual: List[List[str]]) -> float:
+    """
+    每张图片的全部文字按行拼接后比较相似度, 取平均
+    """
+    ratios = [difflib.SequenceMatcher(None, '\n'.join(e), '\n'.join(a)).ratio() for e, a in zip(expected, actual)]
+    return sum(ratios) / len(ratios) if ratios else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ocr backend benchmark")
+    parser.add_argument("--backends", default="paddle,onnx,onnx-int8")
+    parser.add_argument("--images", default=None, help="图片目录, 为空时使用合成图片")
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--lan", default="zh", help="翻译语言代码, eg: zh, en")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.images, args.count, args.lan, args.repeat)
+        return
+
+    baseline = None
+    print(f"{'backend':10} {'startup':>10} {'p50':>9} {'p90':>9} {'max rss':>10} {'agreement':>10}")
+    for backend in args.backends.split(','):
+        try:
+            result = run_backend(backend, args)
+        except Exception as e:
+            print(f"{backend:10} FAIL {e}")
+            continue
+        if baseline is None:
+            baseline = result['texts']
+        print(f"{backend:10} {result['startup_ms']:8.0f}ms {result['p50_ms']:7.1f}ms {result['p90_ms']:7.1f}ms "
+              f"{result['max_rss_mb']:8.0f}MB {agreement(baseline, result['texts']):10.3f}")
+
+
+if __name__ == "__main__":
+    main()
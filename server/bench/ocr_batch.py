@@ -0,0 +1,56 @@
+"""
+OCR 批量识别基准
+
+逐张调用 PaddleOcr.ocr 与一次调用 ocr_batch 比较吞吐, 并检查两种方式的识别结果一致
+
+python -m server.bench.ocr_batch
+python -m server.bench.ocr_batch --images ./samples --count 16 --lan zh
+"""
+import argparse
+import time
+
+from server.base import Language
+from server.bench.samples import load_images
+from server.ocr.paddle_ocr import PaddleOcr
+
+
+def run(images, lan: Language, repeat: int):
+    ocr_tool = PaddleOcr([lan])
+    ocr_tool.warmup(lan)
+
+    single_cost, batch_cost = [], []
+    single, batch = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        single = [ocr_tool.ocr(image, lan) for image in images]
+        single_cost.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batch = ocr_tool.ocr_batch(images, lan)
+        batch_cost.append(time.perf_counter() - start)
+
+    single_texts = [[box.text for box in boxes] for boxes in single]
+    batch_texts = [[box.text for box in boxes] for boxes in batch]
+    lines = sum(len(texts) for texts in single_texts)
+
+    print(f"images: {len(images)}, text lines: {lines}")
+    for name, costs in (('single', single_cost), ('batch', batch_cost)):
+        cost = min(costs)
+        print(f"{name:6} {cost * 1000:9.1f} ms  {len(images) / cost:7.2f} images/s")
+    print(f"speedup: {min(single_cost) / min(batch_cost):.2f}x")
+    print(f"same result: {single_texts == batch_texts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ocr batch benchmark")
+    parser.add_argument("--images", default=None, help="图片目录, 为空时使用合成图片")
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--lan", default="zh", help="翻译语言代码, eg: zh, en")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    run(load_images(args.images, args.count), Language.from_tran(args.lan), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
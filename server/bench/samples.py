@@ -0,0 +1,39 @@
+"""
+OCR 基准使用的图片: 指定目录时读取目录中的图片, 否则生成带中英文文字行的合成图片
+"""
+import os
+import random
+from typing import List
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from server.base import Font
+
+TEXTS = ['限时特惠 全场五折', '新品上市', '净含量 500g', '¥ 99.00', 'Free Shipping',
+         '买一送一', '产地: 浙江杭州', 'Size: 30cm x 20cm', '今日下单 明日送达', '官方正品 假一赔十']
+
+
+def synthetic_image(width: int, height: int, lines: int, seed: int = 0) -> np.ndarray:
+    rnd = random.Random(seed)
+    image = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    step = max(height // max(lines, 1), 1)
+    for i in range(lines):
+        size = rnd.randint(max(step // 4, 12), max(step // 2, 13))
+        font = ImageFont.truetype(Font.SmileySans.value, size)
+        x = rnd.randint(0, max(width // 3, 1))
+        draw.text((x, i * step + (step - size) // 2), rnd.choice(TEXTS), fill=(0, 0, 0), font=font)
+    return np.array(image)
+
+
+def load_images(directory: str = None, count: int = 8, width: int = 750, height: int = 1000,
+                lines: int = 12) -> List[np.ndarray]:
+    if not directory:
+        return [synthetic_image(width, height, lines, seed) for seed in range(count)]
+
+    images = []
+    for name in sorted(os.listdir(directory))[:count]:
+        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
+            images.append(np.array(Image.open(os.path.join(directory, name)).convert('RGB')))
+    return images
@@ -0,0 +1,85 @@
+"""
+不翻译文字判断的基准
+
+对照语料逐条比较 is_non_translatable 与原来的 is_number / is_weight(pint) / is_currency 的结果,
+并比较两者的耗时。结果不一致或未安装 pint 时返回非 0
+
+python -m server.bench.text_filter
+python -m server.bench.text_filter --corpus texts.txt --repeat 20
+"""
+import argparse
+import sys
+import time
+from typing import Callable, List
+
+from server.text import filter as text_filter
+
+CORPUS = [
+    '123', '1,234', '3.14', ' 42 ', '-7', '+0.5', '1e5', '.5', '5.', '１２３',
+    '500g', '500 g', '1.5kg', '2KG', '3 Kg', '250mg', '16oz', '1lb', '2 lbs', '10 pounds', '1 ton', '5t',
+    'kg', 'g', '5 grams', '100ug', '3ct', '1st', '2kgs',
+    '¥99', '¥ 99.00', '$12.50', '12.50$', '€1.000,00', '100元', 'USD 20', '20usd', '1,299', '£5',
+    '30cm', '2 m', '10km', '5 inch', '3ft',
+    '限时特惠', '新品上市', '净含量 500g', '全场五折', 'Free Shipping', 'Size: 30cm x 20cm', 'iPhone 15',
+    'NEW', 'SALE 50%', '买一送一', '第2件半价', 'A4', 'v2.0', '24h', '7天无理由', '', ' ', '-', '¥', 'kg/m',
+    '500g装', '5kg*2', 'gmail', 'good', 'stone age', 'Tom', 'mg', 'OK',
+    # 括号、加减、乘方、希腊字母 μ 和不常见的质量单位
+    '(5kg)', '5kg+2kg', '5kg-2kg', '5kg+2', '5**2kg', '2^3kg', '5kg^2', '(5kg)*2', '5kg×2', '2/t', '1.5/mt',
+    '1 μg', '1 µg', '5 mt', '3 mts', '1 dwt', '3 pennyweight', '1 dalton', '1 electron_mass', '1 m_e', '1 long_ton',
+    '1' * 30 + 'x',
+]
+
+# pint 判定为重量、但 classify 有意按需要翻译处理的写法: 多层或局部的括号、单位前的正负号和小数点、
+# 单位直接相连, 商品图片中不会出现, 漏判只会多翻译一次
+KNOWN_DIFFERENCES = ['((5kg))', '5(kg)', '(5)kg', '+kg', '-mg', '.oz', 'tlb']
+
+
+def reference(text: str) -> bool:
+    return text_filter.is_number(text) or text_filter.is_weight(text) or text_filter.is_currency(text)
+
+
+def timeit(fn: Callable[[str], bool], corpus: List[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            fn(text)
+    return (time.perf_counter() - start) / (repeat * len(corpus)) * 1e6
+
+
+def uncached(text: str) -> bool:
+    return text_filter.classify.__wrapped__(text) in ('number', 'weight', 'currency')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="text filter benchmark")
+    parser.add_argument("--corpus", default=None, help="语料文件, 每行一条, 为空时使用内置语料")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    corpus = CORPUS
+    if args.corpus:
+        with open(args.corpus, 'r', encoding='utf-8') as f:
+            corpus = [line.rstrip('\n') for line in f]
+
+    try:
+        text_filter.get_ureg()
+    except ImportError:
+        print("pint is not installed, can not compare with is_weight")
+        sys.exit(1)
+
+    mismatches = [(text, reference(text)) for text in corpus if reference(text) != text_filter.is_non_translatable(text)]
+    for text in KNOWN_DIFFERENCES:
+        if not reference(text) or text_filter.is_non_translatable(text):
+            mismatches.append((text, 'translatable (known difference)'))
+    for text, expected in mismatches:
+        print(f"MISMATCH {text!r}: expected {expected}")
+    print(f"corpus: {len(corpus)}, mismatches: {len(mismatches)}")
+
+    print(f"pint      {timeit(reference, corpus, args.repeat):8.2f} us/text")
+    print(f"compiled  {timeit(uncached, corpus, args.repeat):8.2f} us/text")
+    print(f"memoized  {timeit(text_filter.is_non_translatable, corpus, args.repeat):8.2f} us/text")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
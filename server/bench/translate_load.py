@@ -0,0 +1,78 @@
+"""
+翻译接口压测
+
+启动本地模拟的百度翻译接口(server/translate/stub.py), 用多个线程并发调用翻译,
+统计成功率、延迟、重试次数和熔断状态, 用于验证限流、重试和熔断的效果
+
+python -m server.bench.translate_load
+python -m server.bench.translate_load --callers 32 --requests 10 --stub-qps 20 --qps 15 --error-rate 0.1
+python -m server.bench.translate_load --down
+"""
+import argparse
+import os
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="translate load test")
+    parser.add_argument("--callers", type=int, default=16, help="并发调用的线程数")
+    parser.add_argument("--requests", type=int, default=5, help="每个线程的调用次数")
+    parser.add_argument("--lines", type=int, default=5, help="每次调用翻译的文字条数")
+    parser.add_argument("--sync", action="store_true", help="使用同步的 BaiduTranslator")
+    parser.add_argument("--qps", type=float, default=10, help="客户端限流的 QPS")
+    parser.add_argument("--stub-qps", type=float, default=10, help="模拟接口允许的 QPS")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=50)
+    parser.add_argument("--down", action="store_true")
+    args = parser.parse_args()
+
+    from server.translate.stub import StubState, serve
+    state = StubState(args.stub_qps, args.error_rate, args.latency, args.down)
+    stub = serve('127.0.0.1', 0, state)
+    # 翻译模块在导入时读取接口地址
+    os.environ['DOOMN_BAIDU_URL'] = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    from server.base import Language
+    from server.translate.baidu import AsyncBaiduTranslator, BaiduTranslator
+    translator = BaiduTranslator(args.qps) if args.sync else AsyncBaiduTranslator(qps=args.qps)
+
+    costs, failures = [], {}
+    lock = threading.Lock()
+
+    def call(caller: int):
+        for i in range(args.requests):
+            queries = [f"文字 {caller}-{i}-{n}" for n in range(args.lines)]
+            start = time.perf_counter()
+            try:
+                result = translator.translate(Language.CHINESE, Language.ENGLISH, queries)
+                assert result == [f"[en]{q}" for q in queries], result
+                with lock:
+                    costs.append(time.perf_counter() - start)
+            except Exception as e:
+                name = getattr(e, 'code', type(e).__name__)
+                with lock:
+                    failures[name] = failures.get(name, 0) + 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(args.callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    costs.sort()
+    total = args.callers * args.requests
+    print(f"calls: {total}, ok: {len(costs)}, failed: {failures}, elapsed: {elapsed:.1f}s")
+    if costs:
+        print(f"latency p50 {costs[len(costs) // 2] * 1000:.0f} ms, p99 {costs[int(len(costs) * 0.99)] * 1000:.0f} ms")
+    print(f"stub requests: {state.requests}, stub errors: {state.errors}")
+    print(f"translator: {translator.stats()}")
+    if not args.sync:
+        translator.close()
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
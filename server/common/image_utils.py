@@ -1,10 +1,7 @@
 from collections import Counter
 
-import cv2
 import numpy as np
 from PIL import ImageDraw, Image, ImageFilter
-from scipy.ndimage import binary_dilation
-from sklearn.cluster import KMeans
 
 
 def expanded_points(points, padding):
@@ -238,6 +235,8 @@ def binarize_image(image, threshold=127):
 
 
 def cal_threshold_using_kmeans(image):
+    from sklearn.cluster import KMeans
+
     # 将图像转换为灰度图并获取像素值
     gray_image = image.convert('L')
     pixels = np.array(gray_image).reshape(-1, 1)
@@ -344,6 +343,8 @@ def adjust_vertices(binary_image, points, max_expansion=12, min_expansion=4):
 
 
 def detect_possible_background_colors(image, edge_sample_size=10, n_clusters=3):
+    from sklearn.cluster import KMeans
+
     pixels = np.array(image)
 
     # 提取图像边缘的像素点（上下左右边缘）
@@ -391,6 +392,8 @@ def filter_background_and_extract_text_color(image, background_tolerance=30):
 
 
 def split_masks(mask: Image.Image):
+    import cv2
+
     # 将 PIL Image 转换为 OpenCV 格式的灰度图像
     mask_cv = np.array(mask.convert('L'))  # 转换为灰度模式 ('L')
 
@@ -421,6 +424,8 @@ def split_masks(mask: Image.Image):
 
 
 def dilated_mask(mask, size=2):
+    from scipy.ndimage import binary_dilation
+
     # 将图像转换为NumPy数组
     mask_array = np.array(mask)
     # 将图像的像素值二值化，确保掩码为布尔值
@@ -0,0 +1,231 @@
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+
+from server import const
+
+
+class Overloaded(Exception):
+    """
+    服务已满载, 调用方应在 retry_after 秒后重试
+    """
+
+    def __init__(self, message: str, retry_after: int = const.RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class StageLimits:
+    """
+    各处理阶段的并发上限, 例如同时最多 2 张图片做 ocr, 避免 CPU 密集的阶段互相抢占
+    上限 <= 0 表示不限制
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = limits
+        self.semaphores = {name: threading.BoundedSemaphore(n) for name, n in limits.items() if n > 0}
+        self.running = {name: 0 for name in self.semaphores}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, stage: str):
+        semaphore = self.semaphores.get(stage)
+        if semaphore is None:
+            yield
+            return
+
+        with semaphore:
+            with self.lock:
+                self.running[stage] += 1
+            try:
+                yield
+            finally:
+                with self.lock:
+                    self.running[stage] -= 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {name: {"running": self.running[name], "limit": self.limits[name]} for name in self.semaphores}
+
+
+class Admission:
+    """
+    请求准入控制
+    最多 max_running 个请求同时执行, 最多 max_waiting 个请求排队等待, 超出时直接拒绝(Overloaded),
+    而不是让所有请求一起变慢。只在事件循环线程中使用
+    """
+
+    def __init__(self, max_running: int, max_waiting: int, retry_after: int = const.RETRY_AFTER):
+        self.max_running = max_running
+        self.max_waiting = max_waiting
+        self.retry_after = retry_after
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # 在事件循环中创建
+        if self._semaphore is None:
+            import anyio
+            self._semaphore = anyio.Semaphore(self.max_running)
+        return self._semaphore
+
+    def check(self):
+        if self.running + self.waiting >= self.max_running + self.max_waiting:
+            self.rejected += 1
+            raise Overloaded(f"server is busy: {self.running} running, {self.waiting} waiting", self.retry_after)
+
+    @asynccontextmanager
+    async def admit(self):
+        self.check()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_running": self.max_running,
+            "max_waiting": self.max_waiting,
+        }
+
+
+class TokenBucket:
+    """
+    令牌桶限流, 每秒补充 rate 个令牌, 最多积累 burst 个
+    reserve 预占一个令牌并返回需要等待的秒数, 由调用方自己 sleep(同步或异步)
+    rate <= 0 表示不限制
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            # 令牌不足时欠下的令牌需要等待补充
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class CircuitOpen(Exception):
+    """
+    熔断中, 直接失败, 调用方应在 retry_after 秒后重试
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    连续失败 failures 次后熔断 reset_timeout 秒, 期间调用直接抛出 CircuitOpen;
+    之后放行一次试探调用, 成功则恢复, 失败则继续熔断。
+    check 返回试探调用的编号(不是试探调用时为 0), 调用结束时必须 release, 没有结果的试探调用(eg: 被取消)让出试探机会
+    """
+
+    def __init__(self, name: str, failures: int, reset_timeout: float):
+        self.name = name
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.consecutive = 0
+        self.opened_at = None
+        # 正在进行的试探调用的编号, 0 表示没有
+        self.probing = 0
+        self.probes = 0
+        self.opens = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def check(self) -> int:
+        if self.failures <= 0:
+            return 0
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return 0
+            if state == 'half_open' and not self.probing:
+                self.probes += 1
+                self.probing = self.probes
+                return self.probing
+            self.rejected += 1
+            retry_after = max(int(self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        raise CircuitOpen(f"{self.name} is unavailable, circuit open", retry_after)
+
+    def success(self):
+        with self.lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self.probing = 0
+
+    def failure(self):
+        with self.lock:
+            self.consecutive += 1
+            if self.probing or (self.opened_at is None and self.consecutive >= self.failures > 0):
+                self.opens += 1
+                self.opened_at = time.monotonic()
+                self.probing = 0
+
+    def release(self, probe: int):
+        if not probe:
+            return
+        with self.lock:
+            if self.probing == probe:
+                self.probing = 0
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive,
+                "opens": self.opens,
+                "rejected": self.rejected,
+            }
+
+
+def backoff(attempt: int, base: float, cap: float = 10) -> float:
+    """
+    第 attempt 次重试前等待的秒数, 指数退避 + 全抖动
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+stage_limits = StageLimits(const.STAGE_LIMITS)
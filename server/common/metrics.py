@@ -0,0 +1,33 @@
+import threading
+
+# prometheus_client 在第一次记录指标时才导入
+_stage_seconds = None
+_lock = threading.Lock()
+
+
+def stage_seconds():
+    global _stage_seconds
+    if _stage_seconds is None:
+        with _lock:
+            if _stage_seconds is None:
+                from prometheus_client import Histogram
+                _stage_seconds = Histogram(
+                    'doomn_stage_seconds',
+                    '图片翻译各阶段耗时',
+                    ['stage', 'lan_pair', 'provider'],
+                    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+                )
+    return _stage_seconds
+
+
+def observe_stage(stage: str, seconds: float, lan_pair: str = '', provider: str = ''):
+    stage_seconds().labels(stage=stage, lan_pair=lan_pair, provider=provider).observe(seconds)
+
+
+def metrics_text():
+    """
+    prometheus 文本格式的指标, 返回 (内容, content-type)
+    """
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+    stage_seconds()
+    return generate_latest(), CONTENT_TYPE_LATEST
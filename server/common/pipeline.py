@@ -0,0 +1,79 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+_END = object()
+
+
+class PipelineItem:
+    """
+    在流水线中流转的数据, 某一阶段出错后跳过后续阶段, 直接输出
+    """
+    index: int
+    value: Any
+    error: Optional[Exception]
+
+    def __init__(self, index: int, value: Any):
+        self.index = index
+        self.value = value
+        self.error = None
+
+
+def _stage_worker(fn: Callable, in_q: queue.Queue, out_q: queue.Queue, alive: List[int], lock: threading.Lock):
+    while True:
+        item = in_q.get()
+        if item is _END:
+            # 通知同一阶段的其他线程, 最后一个退出的线程通知下游
+            in_q.put(_END)
+            with lock:
+                alive[0] -= 1
+                last = alive[0] == 0
+            if last:
+                out_q.put(_END)
+            return
+
+        if item.error is None:
+            try:
+                item.value = fn(item.value)
+            except Exception as e:
+                item.error = e
+        out_q.put(item)
+
+
+def run_pipeline(values: Iterable, stages: List[Tuple[str, Callable, int]],
+                 on_done: Callable[[PipelineItem], None], queue_size: int = 2):
+    """
+    多阶段流水线, 每个阶段由独立的线程执行, 阶段之间用有界队列连接,
+    因此第 N+1 个元素的第一阶段可以和第 N 个元素的第二阶段同时执行
+
+    stages: [(阶段名, 处理函数, 线程数)], 处理函数的输入是上一阶段的输出
+    on_done: 每个元素完成(或失败)时在调用线程中回调, 完成顺序不保证与输入顺序一致
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    threads = []
+    for i, (name, fn, workers) in enumerate(stages):
+        alive = [max(workers, 1)]
+        lock = threading.Lock()
+        for j in range(alive[0]):
+            t = threading.Thread(target=_stage_worker, args=(fn, queues[i], queues[i + 1], alive, lock),
+                                 name=f"pipeline-{name}-{j}", daemon=True)
+            t.start()
+            threads.append(t)
+
+    def feed():
+        for index, value in enumerate(values):
+            queues[0].put(PipelineItem(index, value))
+        queues[0].put(_END)
+
+    feeder = threading.Thread(target=feed, name="pipeline-feed", daemon=True)
+    feeder.start()
+
+    while True:
+        item = queues[-1].get()
+        if item is _END:
+            break
+        on_done(item)
+
+    feeder.join()
+    for t in threads:
+        t.join()
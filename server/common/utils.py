@@ -1,14 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import hashlib
 import os
 import secrets
 import shutil
 import tempfile
 from pathlib import Path
 
-import requests
-from PIL import JpegImagePlugin
-
 
 def singleton(cls):
     _instances = {}
@@ -22,6 +20,8 @@ def singleton(cls):
 
 
 def image_with_json(img, json):
+    from PIL import JpegImagePlugin
+
     # 添加EXIF元数据
     exif = img.info.get('exif', b'')
     new_exif = JpegImagePlugin.get_default_exif()
@@ -72,6 +72,8 @@ def get_filename_from_path(image_path):
 
 
 def download_file(url_path: str, save_dir: str) -> str:
+    import requests
+
     if save_dir is not None:
         os.makedirs(save_dir, exist_ok=True)
 
@@ -88,3 +90,14 @@ def download_file(url_path: str, save_dir: str) -> str:
     dest = directory / Path(url_path).name
     shutil.move(temp_dir / Path(url_path).name, dest)
     return str(dest.resolve())
+
+
+def image_hash(image) -> str:
+    """
+    根据解码后的像素计算图片的 sha256, 与文件格式、元数据无关
+    :param image: PIL 图像对象
+    """
+    m = hashlib.sha256()
+    m.update(f"{image.mode}:{image.width}x{image.height}:".encode('utf-8'))
+    m.update(image.tobytes())
+    return m.hexdigest()
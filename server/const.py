@@ -3,4 +3,105 @@ import os
 _current_dir = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.normpath(os.path.join(_current_dir, '../'))
 UPLOADS_DIR = os.path.join(ROOT_DIR, "uploads")
-MODEL_DIR = os.path.join(ROOT_DIR, "models")
\ No newline at end of file
+MODEL_DIR = os.path.join(ROOT_DIR, "models")
+
+# 异步任务: 工作线程数、排队上限、内存中保留的已完成任务数
+JOB_WORKERS = int(os.environ.get("DOOMN_JOB_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.environ.get("DOOMN_JOB_QUEUE_SIZE", 64))
+JOB_KEEP_FINISHED = int(os.environ.get("DOOMN_JOB_KEEP_FINISHED", 1000))
+
+# 批量翻译: 流水线各阶段之间的队列长度
+BATCH_QUEUE_SIZE = int(os.environ.get("DOOMN_BATCH_QUEUE_SIZE", 2))
+
+# 翻译结果缓存
+CACHE_DIR = os.environ.get("DOOMN_CACHE_DIR", os.path.join(ROOT_DIR, "cache"))
+RESULT_CACHE_MB = int(os.environ.get("DOOMN_RESULT_CACHE_MB", 512))
+# 异步任务的结果文件, 不能放在 /static 对外提供的 UPLOADS_DIR 下
+JOB_RESULT_DIR = os.environ.get("DOOMN_JOB_RESULT_DIR", os.path.join(CACHE_DIR, "jobs"))
+
+# 并发控制: 同时执行的请求数、排队等待的请求数, 满载时建议客户端重试的秒数
+MAX_RUNNING = int(os.environ.get("DOOMN_MAX_RUNNING", 8))
+MAX_WAITING = int(os.environ.get("DOOMN_MAX_WAITING", 32))
+RETRY_AFTER = int(os.environ.get("DOOMN_RETRY_AFTER", 5))
+# 各阶段的并发上限, <= 0 表示不限制
+STAGE_LIMITS = {
+    "ocr": int(os.environ.get("DOOMN_LIMIT_OCR", 2)),
+    "inpaint": int(os.environ.get("DOOMN_LIMIT_INPAINT", 2)),
+    "upload": int(os.environ.get("DOOMN_LIMIT_UPLOAD", 8)),
+    "translate": int(os.environ.get("DOOMN_LIMIT_TRANSLATE", 8)),
+}
+
+# 模型服务进程地址, eg: 127.0.0.1:8500, 为空时在本进程加载模型
+MODEL_SERVER = os.environ.get("DOOMN_MODEL_SERVER", "")
+# 模型服务的连接密钥, 没有默认值, 模型服务和 worker 必须配置相同的值
+# 连接上的请求用 pickle 反序列化, 知道密钥即可在模型服务进程中执行任意代码, 端口不能暴露到内网以外
+MODEL_SERVER_AUTHKEY = os.environ.get("DOOMN_MODEL_SERVER_AUTHKEY", "").encode("utf-8")
+
+# 启动时后台预加载的模型: ocr 语言(翻译语言代码, 逗号分隔)、是否预加载擦图模型
+WARMUP_LANS = [lan for lan in os.environ.get("DOOMN_WARMUP_LANS", "zh,en").split(",") if lan]
+WARMUP_INPAINT = os.environ.get("DOOMN_WARMUP_INPAINT", "1") == "1"
+
+# ocr 结果缓存: 内存中的条目数, 磁盘缓存大小(0 表示不使用磁盘缓存)
+OCR_CACHE_ENTRIES = int(os.environ.get("DOOMN_OCR_CACHE_ENTRIES", 256))
+OCR_CACHE_DISK_MB = int(os.environ.get("DOOMN_OCR_CACHE_DISK_MB", 128))
+
+# ocr 批量识别: 识别模型每批的文字行数; 合并并发请求的等待窗口(毫秒, 0 表示不合并)和每批最多图片数
+# 开启合并时需要同时调大 DOOMN_LIMIT_OCR, 否则同时到达的请求数不超过 ocr 阶段的并发上限
+OCR_REC_BATCH = int(os.environ.get("DOOMN_OCR_REC_BATCH", 16))
+OCR_BATCH_WINDOW_MS = int(os.environ.get("DOOMN_OCR_BATCH_WINDOW_MS", 0))
+OCR_BATCH_SIZE = int(os.environ.get("DOOMN_OCR_BATCH_SIZE", 8))
+
+# ocr 文字检测时图片长边的上限(像素), 超过时缩小后检测、在原图上识别; 0 表示交给 PaddleOCR 处理原图
+OCR_DET_LONG_SIDE = int(os.environ.get("DOOMN_OCR_DET_LONG_SIDE", 960))
+
+# 超长图片切片识别: 切片边长、相邻切片重叠的像素、触发切片的长宽比、并行识别的线程数; 切片边长为 0 时不切片
+OCR_TILE_SIZE = int(os.environ.get("DOOMN_OCR_TILE_SIZE", 1600))
+OCR_TILE_OVERLAP = int(os.environ.get("DOOMN_OCR_TILE_OVERLAP", 200))
+OCR_TILE_RATIO = float(os.environ.get("DOOMN_OCR_TILE_RATIO", 3))
+OCR_TILE_WORKERS = int(os.environ.get("DOOMN_OCR_TILE_WORKERS", 2))
+
+# 所有 ocr 语言共用的文字检测和方向分类模型所属的 PaddleOCR 语言, 中文模型同时覆盖中英日韩
+OCR_DET_LAN = os.environ.get("DOOMN_OCR_DET_LAN", "ch")
+
+# ocr 推理后端: paddle 或 onnx; onnx 模型目录、是否使用 int8 动态量化、每个模型推理的线程数(0 表示由 onnxruntime 决定)
+OCR_BACKEND = os.environ.get("DOOMN_OCR_BACKEND", "paddle")
+OCR_ONNX_DIR = os.environ.get("DOOMN_OCR_ONNX_DIR", os.path.join(MODEL_DIR, "ocr_onnx"))
+OCR_ONNX_INT8 = os.environ.get("DOOMN_OCR_ONNX_INT8", "0") == "1"
+OCR_ONNX_THREADS = int(os.environ.get("DOOMN_OCR_ONNX_THREADS", 4))
+
+# ocr 模型的内存预算(MB, 0 表示不限制), 超出时淘汰最久未使用的语言模型; 无法测量模型内存时按 OCR_MODEL_DEFAULT_MB 计算
+OCR_MODEL_BUDGET_MB = int(os.environ.get("DOOMN_OCR_MODEL_BUDGET_MB", 0))
+OCR_MODEL_DEFAULT_MB = int(os.environ.get("DOOMN_OCR_MODEL_DEFAULT_MB", 200))
+
+# 翻译记忆: sqlite 文件、最多保存的条目数、过期时间(秒, 0 表示不过期)
+TRANSLATION_MEMORY_DB = os.environ.get("DOOMN_TRANSLATION_MEMORY_DB", os.path.join(CACHE_DIR, "translation.db"))
+TRANSLATION_MEMORY_ENTRIES = int(os.environ.get("DOOMN_TRANSLATION_MEMORY_ENTRIES", 1000000))
+TRANSLATION_MEMORY_TTL = int(os.environ.get("DOOMN_TRANSLATION_MEMORY_TTL", 30 * 24 * 3600))
+
+# 百度翻译: 是否使用异步的翻译(连接池 + POST + 并发分块), 每个请求的最大字节数(百度建议 6000 以内), 并发请求数
+BAIDU_ASYNC = os.environ.get("DOOMN_BAIDU_ASYNC", "1") == "1"
+BAIDU_CHUNK_BYTES = int(os.environ.get("DOOMN_BAIDU_CHUNK_BYTES", 6000))
+BAIDU_CONCURRENCY = int(os.environ.get("DOOMN_BAIDU_CONCURRENCY", 4))
+
+# 合并并发任务的翻译请求: 等待窗口(毫秒, 0 表示不合并)、每次上游请求最多的文字条数、发送请求的线程数
+TRANSLATE_BATCH_WINDOW_MS = int(os.environ.get("DOOMN_TRANSLATE_BATCH_WINDOW_MS", 5))
+TRANSLATE_BATCH_SIZE = int(os.environ.get("DOOMN_TRANSLATE_BATCH_SIZE", 200))
+TRANSLATE_BATCH_WORKERS = int(os.environ.get("DOOMN_TRANSLATE_BATCH_WORKERS", 8))
+
+# 百度翻译接口地址(可以指向本地的模拟服务)、账号的 QPS(0 表示不限流)和突发上限、
+# 可重试错误的重试次数和退避基准(秒)、连续失败多少次后熔断以及熔断持续的秒数
+BAIDU_URL = os.environ.get("DOOMN_BAIDU_URL", "https://api.fanyi.baidu.com")
+BAIDU_QPS = float(os.environ.get("DOOMN_BAIDU_QPS", 10))
+BAIDU_BURST = int(os.environ.get("DOOMN_BAIDU_BURST", 1))
+BAIDU_RETRIES = int(os.environ.get("DOOMN_BAIDU_RETRIES", 3))
+BAIDU_RETRY_BASE = float(os.environ.get("DOOMN_BAIDU_RETRY_BASE", 0.2))
+BAIDU_BREAKER_FAILURES = int(os.environ.get("DOOMN_BAIDU_BREAKER_FAILURES", 5))
+BAIDU_BREAKER_RESET = float(os.environ.get("DOOMN_BAIDU_BREAKER_RESET", 30))
+
+# 对冲翻译请求: 各语言对使用的翻译后端, eg: "zh-en:baidu,other;*:baidu", 为空时只使用 baidu;
+# 后端名称需要在 server/task.py 中用 backend_register 注册, 目前只注册了 baidu;
+# 主后端样本不足时对冲前等待的毫秒数、计算 p90 需要的最少样本数、发送请求的线程数
+TRANSLATE_ROUTES = os.environ.get("DOOMN_TRANSLATE_ROUTES", "")
+TRANSLATE_HEDGE_DEFAULT_MS = int(os.environ.get("DOOMN_TRANSLATE_HEDGE_DEFAULT_MS", 1500))
+TRANSLATE_HEDGE_MIN_SAMPLES = int(os.environ.get("DOOMN_TRANSLATE_HEDGE_MIN_SAMPLES", 20))
+TRANSLATE_HEDGE_WORKERS = int(os.environ.get("DOOMN_TRANSLATE_HEDGE_WORKERS", 16))
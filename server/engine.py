@@ -1,8 +1,10 @@
 import asyncio
 import math
 import time
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import List, Type
+from typing import Callable, Dict, List, Type
 
 import numpy as np
 import requests
@@ -15,13 +17,18 @@ from psd2fabric.fabric.text import TextFabricLayer
 from server.base import PicTransOcrBox, PicTransImage, Language, Font
 from server.fabric.font_color import calculate_text_color
 from server.ocr.base import OCR
-from server.text.filter import is_number, is_weight, is_currency
+from server.text.filter import is_non_translatable
 from server.translate.base import Translate
 from server.common.image_utils import crop_with_mask, is_solid_color, cal_threshold_using_kmeans, binarize_image, \
     adjust_vertices, points_to_rect, split_masks, dilated_mask
+from server.common.limits import stage_limits
 from server.common.utils import add_prefix_to_filename
 
 
+# 与擦图并行执行的翻译请求, 实际并发由 stage_limits 控制
+translate_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='translate')
+
+
 def provider_register(cls):
     PROVIDERS.append(cls)
     return cls
@@ -74,10 +81,11 @@ def erase_togather(pt, ocr_boxes, padding=1):
     # new_image = batch_inpaint(origin_image.convert("RGB"), [mask])
 
     # 方案二：拆解成独立的mask擦除
-    origin_image = pt.origin_image
+    # 擦除过程会修改 alpha 通道, 不能直接使用原图
+    origin_image = pt.origin_image.copy()
     new_image = origin_image.copy()
     masks = split_masks(mask)
-    from .erase.batch_processing import batch_inpaint
+    from .erase import batch_inpaint
     for m in masks:
         origin_image.putalpha(m)
         b = origin_image.getbbox()
@@ -103,9 +111,10 @@ def erase_togather(pt, ocr_boxes, padding=1):
     return new_image.convert("RGB"), mask
 
 
-def erase(pt, ocr_boxes, single=False, padding=10):
+def erase(pt, ocr_boxes, single=False, padding=10, on_box=None):
     """
     single: 是mask独立擦除，还是整体一起擦除
+    on_box: 每个box的背景图(erase_img)就绪后回调 on_box(index, box), index 为 box 在 ocr_boxes 中的下标
 
     *** 假定ocr的文字不会超出边框
 
@@ -115,18 +124,69 @@ def erase(pt, ocr_boxes, single=False, padding=10):
 
     # 过滤纯色背景、精调box的位置、生成text的mask
     crop_boxes(pt.origin_image, ocr_boxes, padding)
-    un_solid = [item for item in ocr_boxes if not item.box_solid]
+    inpaint_boxes(pt, ocr_boxes, single, on_box)
+
+
+def inpaint_boxes(pt, ocr_boxes, single=False, on_box=None):
+    """
+    擦除非纯色背景box中的文字, 需要先执行 crop_boxes
+    纯色背景的box在 crop_boxes 时已经生成了背景图, 最先回调
+    整体擦除(single=False)时所有非纯色背景的box在整图擦除结束后才一起回调
+    """
+    if len(ocr_boxes) == 0:
+        return
+
+    un_solid = [(i, item) for i, item in enumerate(ocr_boxes) if not item.box_solid]
+    if on_box:
+        for i, box in enumerate(ocr_boxes):
+            if box.box_solid:
+                on_box(i, box)
+
     # 根据mask擦除
-    from .erase.batch_processing import batch_inpaint
+    from .erase import batch_inpaint
     if single:
         # todo 重叠的mask进行合并擦除
-        for box in un_solid:
-            box.erase_img = batch_inpaint(box.box_img, [box.text_mask])
+        for i, box in un_solid:
+            with stage_limits.slot('inpaint'), pt.context.timer('inpaint'):
+                box.erase_img = batch_inpaint(box.box_img, [box.text_mask])
+            if on_box:
+                on_box(i, box)
     else:
-        erase_togather(pt, un_solid)
+        with stage_limits.slot('inpaint'), pt.context.timer('inpaint'):
+            erase_togather(pt, [box for _, box in un_solid])
+        if on_box:
+            for i, box in un_solid:
+                on_box(i, box)
+
+
+def restore_dropped(origin_image, kept_boxes, dropped_boxes, padding=6):
+    """
+    擦图时包含了不需要翻译的 box, 将它们被擦除的文字从原图恢复到相交的背景图中
+    padding: 与擦图时 mask 的膨胀大小一致
+    """
+    if not dropped_boxes:
+        return
+
+    dropped_masks = [(box.box_rect, dilated_mask(box.text_mask, padding)) for box in dropped_boxes]
+    for box in kept_boxes:
+        # 纯色背景没有使用擦图结果
+        if box.box_solid:
+            continue
+        left, top, right, bottom = box.box_rect
+        for (d_left, d_top, d_right, d_bottom), mask in dropped_masks:
+            # 相交区域
+            i_left, i_top = max(left, d_left), max(top, d_top)
+            i_right, i_bottom = min(right, d_right), min(bottom, d_bottom)
+            if i_left >= i_right or i_top >= i_bottom:
+                continue
+            region = origin_image.crop((i_left, i_top, i_right, i_bottom)).convert('RGB')
+            region_mask = mask.crop((i_left - d_left, i_top - d_top, i_right - d_left, i_bottom - d_top))
+            box.erase_img.paste(region, (i_left - left, i_top - top), region_mask)
 
 
 class PicTransProvider:
+    # 处理流程或结果格式变化时修改, 使旧的结果缓存失效
+    version: str = '1'
     from_lan: Language
     to_lan: Language
     ocr_tool: OCR
@@ -145,13 +205,8 @@ class PicTransProvider:
     def text_process(self, ocr_boxes):
         result = []
         for box in ocr_boxes:
-            if is_number(box.text):
-                continue
-
-            if is_weight(box.text):
-                continue
-
-            if is_currency(box.text):
+            # 数字、重量、货币不翻译
+            if is_non_translatable(box.text):
                 continue
             result.append(box)
         return result
@@ -170,30 +225,62 @@ class PicTransProvider:
 
     def trans(self, pt: PicTransImage) -> Fabric:
         """
-        核心流程
+        核心流程, 按依赖关系执行
+        ocr -> 翻译(网络请求) 与 擦图(CPU) 并行 -> 合成
+        擦图只依赖 ocr 的结果, 使用过滤后的全部 box; 翻译后被 post_translate 去掉的 box 在合成前恢复原图像素
         """
-        # step1: 文字内容和位置提取
-        self.ocr(pt)
-        # step2: 文字内容翻译
-        self.translate(pt)
-        # step3: 擦图
-        start_time = time.time()
-        erase(pt, pt.ocr_boxes)
-        print(f"Execution time: {time.time() - start_time} seconds")
-        # step4: 合成
-        return self.compose(pt)
+        with pt.context.stage('ocr'):
+            self.ocr(pt)
+        ocr_boxes = pt.ocr_boxes
+
+        translating = translate_executor.submit(self.run_stage, pt, 'translate', self.translate)
+        try:
+            with pt.context.stage('erase'):
+                erase(pt, ocr_boxes)
+        finally:
+            # 擦图失败时也等待翻译结束, 避免后台线程继续修改 pt
+            futures.wait([translating])
+        translating.result()
+
+        with pt.context.stage('compose'):
+            kept = set(id(box) for box in pt.ocr_boxes)
+            restore_dropped(pt.origin_image, pt.ocr_boxes, [box for box in ocr_boxes if id(box) not in kept])
+            return self.compose(pt)
+
+    @staticmethod
+    def run_stage(pt: PicTransImage, name: str, step: Callable[[PicTransImage], None]):
+        with pt.context.stage(name):
+            step(pt)
+
+    def stages(self):
+        """
+        按顺序执行的处理阶段, 每个阶段的输入输出都在 PicTransImage 上
+        step1: 文字内容和位置提取
+        step2: 文字内容翻译
+        step3: 擦图
+        step4: 合成
+        """
+        return [
+            ('ocr', self.ocr),
+            ('translate', self.translate),
+            ('erase', self.erase),
+            ('compose', self.compose),
+        ]
 
     def ocr(self, pt: PicTransImage) -> List[PicTransOcrBox]:
-        ocr_boxes = self.ocr_tool.ocr(np.array(pt.origin_image), pt.from_lan)
+        with stage_limits.slot('ocr'), pt.context.timer('ocr'):
+            ocr_boxes = self.ocr_tool.ocr(np.array(pt.origin_image), pt.from_lan)
         # 过滤不需要处理的部分
-        pt.ocr_boxes = self.text_process(ocr_boxes or [])
+        with pt.context.timer('text_filter'):
+            pt.ocr_boxes = self.text_process(ocr_boxes or [])
 
     def translate(self, pt: PicTransImage):
         from_texts = [box.text for box in pt.ocr_boxes]
         if len(from_texts) <= 0:
             return []
 
-        texts = self.translator.translate(pt.from_lan, pt.to_lan, from_texts)
+        with stage_limits.slot('translate'), pt.context.timer('translate'):
+            texts = self.translator.translate(pt.from_lan, pt.to_lan, from_texts)
 
         for i, to_text in enumerate(texts):
             pt.ocr_boxes[i].to_lan = pt.to_lan
@@ -202,15 +289,42 @@ class PicTransProvider:
         # 翻译后处理,过滤掉无需翻译的内容
         pt.ocr_boxes = self.post_translate(pt.ocr_boxes)
 
-    def compose(self, pt: PicTransImage) -> Fabric:
+    def trans_stream(self, pt: PicTransImage, emit: Callable[[str, object], None]) -> Fabric:
+        """
+        渐进式输出
+        翻译完成后先输出 layout: 原图 + 文字图层的 Fabric,
+        擦图过程中每个 box 的背景图就绪后输出 patch, 最后返回完整的 Fabric
+        为了逐个输出 patch, 每个 box 独立擦除(single), 不做整体擦除的边缘平滑
+        """
+        with pt.context.stage('ocr'):
+            self.ocr(pt)
+        with pt.context.stage('translate'):
+            self.translate(pt)
+        with pt.context.stage('layout'):
+            crop_boxes(pt.origin_image, pt.ocr_boxes, 10)
+            emit('layout', self.compose(pt, with_bg=False))
+
+        def on_box(index: int, box: PicTransOcrBox):
+            emit('patch', self.fabric_patch(pt, index, box))
+
+        with pt.context.stage('erase'):
+            inpaint_boxes(pt, pt.ocr_boxes, single=True, on_box=on_box)
+        with pt.context.stage('compose'):
+            return self.compose(pt)
+
+    def erase(self, pt: PicTransImage):
+        erase(pt, pt.ocr_boxes)
+
+    def compose(self, pt: PicTransImage, with_bg=True) -> Fabric:
         """
         原图放在最底层
         每一个orc_box转化成2层，bg + text
         bg: 擦除后的背景
         text: 翻译后的文字
+        with_bg: 为 False 时只输出文字图层, 用于擦图完成前的预览
         """
         layers = []
-        bg_layer = ImageFabricLayer("bg", 0, 0, pt.origin_image.width, pt.origin_image.height, pt.origin_image_url)
+        bg_layer = ImageFabricLayer("bg", 0, 0, pt.origin_image.width, pt.origin_image.height, pt.upload_origin())
         bg_layer.__setattr__("crossOrigin", "anonymous")
         bg_layer.__setattr__("hasControls", False)
         bg_layer.__setattr__("selectable", False)
@@ -222,21 +336,25 @@ class PicTransProvider:
         text_bg_layers = []
 
         for index, box in enumerate(pt.ocr_boxes):
-            t_layer, b_layer = self.fabric_box(pt, index, box)
+            t_layer = self.fabric_text(pt, box)
+            left, top, right, bottom = box.box_rect
 
-            group = GroupFabricLayer("翻译图层", b_layer.left, b_layer.top, b_layer.width, b_layer.height)
-
-            b_layer.top = 0
-            b_layer.left = 0
-            b_layer.originX = 'center'
-            b_layer.originY = 'center'
+            group = GroupFabricLayer("翻译图层", left, top, right - left, bottom - top)
 
             t_layer.top = 0
             t_layer.left = 0
             t_layer.originX = 'center'
             t_layer.originY = 'center'
 
-            group.add([b_layer, t_layer])
+            if with_bg:
+                b_layer = self.fabric_bg(pt, index, box)
+                b_layer.top = 0
+                b_layer.left = 0
+                b_layer.originX = 'center'
+                b_layer.originY = 'center'
+                group.add([b_layer, t_layer])
+            else:
+                group.add([t_layer])
             group.type = 'd-pt-text'
             group.hasControls = False
             # group.selectable = False
@@ -250,18 +368,48 @@ class PicTransProvider:
         fb = Fabric(layers, 0, 0, pt.origin_image.width, pt.origin_image.height)
         fb.objects[0]['fill'] = "#ffffff"
         fb.background = "#ddd"
+        pt.fabric = fb
         return fb
 
     def fabric_box(self, pt: PicTransImage, index: int, box: PicTransOcrBox):
-        # 1.文字的背景图层
-        bg_url = pt.context.task_context.oss_client.upload_image(box.erase_img, add_prefix_to_filename(pt.origin_image_name, f"_bg{index}"))
+        return self.fabric_text(pt, box), self.fabric_bg(pt, index, box)
+
+    def fabric_bg(self, pt: PicTransImage, index: int, box: PicTransOcrBox):
+        """
+        文字的背景图层, 上传后的地址缓存在 box.erase_img_url
+        """
+        if not box.erase_img_url:
+            with stage_limits.slot('upload'), pt.context.timer('upload'):
+                box.erase_img_url = pt.context.task_context.oss_client.upload_image(
+                    box.erase_img, add_prefix_to_filename(pt.origin_image_name, f"_bg{index}"))
         b_layer = ImageFabricLayer(f"bg{index}", box.box_rect[0], box.box_rect[1], box.box_rect[2] - box.box_rect[0],
                                    box.box_rect[3] - box.box_rect[1],
-                                   bg_url)
+                                   box.erase_img_url)
         b_layer.__setattr__("crossOrigin", "anonymous")
         b_layer.__setattr__("selectable", "false")
+        return b_layer
 
-        # 2. 字体层
+    def fabric_patch(self, pt: PicTransImage, index: int, box: PicTransOcrBox) -> Dict:
+        """
+        擦图完成后补充到第 index 个翻译图层中的背景, 以及根据新背景计算的文字颜色
+        """
+        b_layer = self.fabric_bg(pt, index, box)
+        return {
+            "index": index,
+            "background": {
+                "type": "image",
+                "name": f"bg{index}",
+                "left": b_layer.left,
+                "top": b_layer.top,
+                "width": b_layer.width,
+                "height": b_layer.height,
+                "src": box.erase_img_url,
+            },
+            "fill": f"rgb{self.box_font_color(box)}",
+        }
+
+    def fabric_text(self, pt: PicTransImage, box: PicTransOcrBox):
+        # 字体层
         # 计算字体排列方向
         line = self.box_text_content(box)
         # 计算角度
@@ -271,7 +419,8 @@ class PicTransProvider:
         # 字体
         font = self.box_font()
         # 计算文字的位置
-        pos, size = self.box_font_pos_size(pt.origin_image, box, line, font, direction=self.box_direction(box))
+        with pt.context.timer('font_fit'):
+            pos, size = self.box_font_pos_size(pt.origin_image, box, line, font, direction=self.box_direction(box))
 
         t_layer = TextFabricLayer(line, pos[0], pos[1], pos[2], pos[3])
         t_layer.set_text(font.name, size, line)
@@ -284,7 +433,7 @@ class PicTransProvider:
             "to_text": box.to_text
         })
 
-        return t_layer, b_layer
+        return t_layer
 
     def box_is_ver(self, box: PicTransOcrBox):
         """
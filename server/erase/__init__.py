@@ -0,0 +1,25 @@
+from server import const
+
+
+def batch_inpaint(image, masks):
+    """
+    根据配置在本进程或模型服务进程中擦除
+    """
+    if const.MODEL_SERVER:
+        from server.model_server import model_client
+        return model_client().inpaint(image, masks)
+
+    from server.erase.batch_processing import batch_inpaint as local_batch_inpaint
+    return local_batch_inpaint(image, masks)
+
+
+def warmup():
+    """
+    加载擦图模型, 并用一张小图执行一次推理
+    """
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (64, 64), (255, 255, 255))
+    mask = Image.new('L', (64, 64), 0)
+    ImageDraw.Draw(mask).rectangle((24, 24, 40, 40), fill=255)
+    batch_inpaint(image, [mask])
@@ -1,4 +1,5 @@
 import json
+import threading
 from pathlib import Path
 from typing import Dict, Optional
 
@@ -20,7 +21,22 @@ def glob_images(path: Path) -> Dict[str, Path]:
 
 default_device = "cuda" if torch.cuda.is_available() else "cpu"
 default_model = 'lama'
-default_model_manager = ModelManager(name=default_model, device=default_device)
+# 模型在第一次擦除时加载
+default_model_manager: Optional[ModelManager] = None
+_model_manager_lock = threading.Lock()
+
+
+def get_model_manager() -> ModelManager:
+    global default_model_manager
+    if default_model_manager is None:
+        with _model_manager_lock:
+            if default_model_manager is None:
+                default_model_manager = ModelManager(name=default_model, device=default_device)
+    return default_model_manager
+
+
+def is_loaded() -> bool:
+    return default_model_manager is not None
 
 
 def batch_inpaint(
@@ -31,7 +47,7 @@ def batch_inpaint(
         config: Optional[Path] = None,
         concat: bool = False,
 ):
-    return _batch_inpaint(image, masks, model, device, config, concat, default_model_manager)
+    return _batch_inpaint(image, masks, model, device, config, concat, get_model_manager())
 
 
 def _batch_inpaint(
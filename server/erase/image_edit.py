@@ -3,14 +3,21 @@ import time
 import json
 
 import requests
-from volcengine.visual.VisualService import VisualService
 
 AK = "xxxx"
 SK = "xxxx"
 req_key = "seededit_v3.0"
-visual = VisualService()
-visual.set_ak(AK)
-visual.set_sk(SK)
+_visual = None
+
+
+def get_visual():
+    global _visual
+    if _visual is None:
+        from volcengine.visual.VisualService import VisualService
+        _visual = VisualService()
+        _visual.set_ak(AK)
+        _visual.set_sk(SK)
+    return _visual
 
 
 def image_to_base64(image_path_or_url):
@@ -61,7 +68,7 @@ def edit_image(url, query_max_retry=20, query_interval=3):
     task_id = None
     if not task_id:
         try:
-            submit_resp = visual.cv_sync2async_submit_task(submit_req)
+            submit_resp = get_visual().cv_sync2async_submit_task(submit_req)
         except Exception as e:
             return None, "", f"submit failed: {e}"
 
@@ -81,7 +88,7 @@ def edit_image(url, query_max_retry=20, query_interval=3):
                 "req_json": json.dumps({"return_url": True})
             }
 
-            query_resp = visual.cv_sync2async_get_result(query_req)
+            query_resp = get_visual().cv_sync2async_get_result(query_req)
             data = query_resp["data"]
             status_str = data.get("status")
 
@@ -1,9 +1,7 @@
 from collections import Counter
 
-import cv2
 import numpy as np
 from PIL import Image
-from sklearn.cluster import KMeans
 
 
 def calculate_dominant_color(image, box, k=3):
@@ -81,6 +79,8 @@ def get_mode_color(image):
 
 # 主色调提取算法使用聚类算法（如 K-means）来找到图像区域中的主要颜色。这种方法在需要识别图像中主要颜色时特别有用。
 def get_dominant_color(image, k=4):
+    from sklearn.cluster import KMeans
+
     # 将图像转换为 numpy 数组并重塑为二维数组
     np_image = np.array(image)
     np_image = np_image.reshape((np_image.shape[0] * np_image.shape[1], 3))
@@ -98,6 +98,8 @@ def get_dominant_color(image, k=4):
 
 
 def preprocess_image(image):
+    import cv2
+
     # 确保图像有三个通道（RGB）
     if image.mode != 'RGB':
         image = image.convert('RGB')
@@ -109,6 +111,8 @@ def preprocess_image(image):
 
 
 def get_text_area(image):
+    import cv2
+
     # 确保图像有三个通道（RGB）
     if image.mode != 'RGB':
         image = image.convert('RGB')
@@ -120,6 +124,8 @@ def get_text_area(image):
 
 
 def get_dominant_color2(image, k=3, ignore_background=True):
+    from sklearn.cluster import KMeans
+
     # 将图像数据转换为二维数组
     image_np = np.array(image)
 
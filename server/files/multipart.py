@@ -0,0 +1,108 @@
+"""
+流式解析 multipart/form-data 的上传请求
+
+UploadFile 在进入接口函数之前, starlette 已经把整个请求体写入了自己的临时文件(超过 1MB 时落盘),
+再复制到 upload 目录就是两次写入。这里直接解析 request.stream(), 文件内容边接收边写入最终位置
+"""
+import os
+from typing import Optional
+
+from server.files.uploader import Uploader
+
+
+class BadUpload(Exception):
+    """
+    请求体不是合法的 multipart/form-data, 或缺少文件字段
+    """
+    pass
+
+
+def _parser_module():
+    try:
+        from python_multipart import multipart
+    except ImportError:
+        # python-multipart < 0.0.13
+        from multipart import multipart
+    return multipart
+
+
+class MultipartUpload:
+    """
+    只把 field 字段的文件内容写入 writer, 其它字段忽略
+    write 和 finish 会写磁盘, 在协程中调用时放到线程中执行
+    """
+
+    def __init__(self, content_type: str, uploader: Uploader, field: str = "image"):
+        multipart = _parser_module()
+        mime, options = multipart.parse_options_header(content_type)
+        boundary = options.get(b'boundary')
+        if mime != b'multipart/form-data' or not boundary:
+            raise BadUpload(f"expected multipart/form-data, got: {content_type}")
+
+        self.multipart = multipart
+        self.writer = uploader.stream_writer()
+        self.field = field.encode('utf-8')
+        self.filename: Optional[str] = None
+        self.found = False
+        # 当前 part 的状态
+        self.header_field = b''
+        self.header_value = b''
+        self.disposition = None
+        self.writing = False
+        self.parser = multipart.MultipartParser(boundary, {
+            'on_part_begin': self.on_part_begin,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+            'on_part_data': self.on_part_data,
+            'on_part_end': self.on_part_end,
+        })
+
+    def on_part_begin(self):
+        self.disposition = None
+        self.writing = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        if self.header_field.lower() == b'content-disposition':
+            self.disposition = self.header_value
+        self.header_field = b''
+        self.header_value = b''
+
+    def on_headers_finished(self):
+        if self.disposition is None:
+            return
+        _, options = self.multipart.parse_options_header(self.disposition)
+        if options.get(b'name') == self.field and b'filename' in options and not self.found:
+            self.found = True
+            self.writing = True
+            self.filename = options[b'filename'].decode('utf-8', 'replace')
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.writing:
+            self.writer.write(data[start:end])
+
+    def on_part_end(self):
+        self.writing = False
+
+    def write(self, chunk: bytes):
+        self.parser.write(chunk)
+
+    def finish(self) -> str:
+        """
+        请求体接收完后调用, 返回文件的 URL
+        """
+        self.parser.finalize()
+        if not self.found:
+            raise BadUpload(f"missing file field: {self.field.decode('utf-8')}")
+        ext = os.path.splitext(self.filename or '')[-1].lower().strip(".") or "png"
+        return self.writer.commit(ext)
+
+    def abort(self):
+        self.writer.abort()
@@ -1,6 +1,8 @@
 # utils/uploader.py
+import hashlib
 import io
 import os
+import tempfile
 from uuid import uuid4
 
 
@@ -42,3 +44,61 @@ class Uploader:
         copyfile(filepath, dest_path)
 
         return f"{self.base_url}/{object_name}"
+
+    def upload_stream(self, stream, ext: str, prefix: str = "images", chunk_size: int = 1024 * 1024) -> str:
+        """
+        分块读取 stream 直接写入 upload 目录, 同时计算 sha256, 文件以内容 hash 命名。
+        相同内容的文件已存在时丢弃本次写入, 返回已有文件的 URL。
+        """
+        writer = self.stream_writer(prefix)
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            return writer.commit(ext)
+        except Exception:
+            writer.abort()
+            raise
+
+    def stream_writer(self, prefix: str = "images") -> "StreamWriter":
+        return StreamWriter(self, prefix)
+
+
+class StreamWriter:
+    """
+    分块写入 upload 目录下的临时文件, 同时计算 sha256, commit 时以内容 hash 命名, 失败时调用 abort 删除临时文件
+    """
+
+    def __init__(self, uploader: Uploader, prefix: str):
+        self.uploader = uploader
+        self.prefix = prefix
+        save_dir = os.path.join(uploader.base_dir, prefix)
+        os.makedirs(save_dir, exist_ok=True)
+        # 临时文件和目标文件在同一目录, 保证 rename 是原子的
+        fd, self.tmp_path = tempfile.mkstemp(dir=save_dir, suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.sha256.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, ext: str) -> str:
+        self.file.close()
+        object_name = f"{self.prefix}/{self.sha256.hexdigest()}.{ext}"
+        dest_path = os.path.join(self.uploader.base_dir, object_name)
+        if os.path.exists(dest_path):
+            os.remove(self.tmp_path)
+        else:
+            os.chmod(self.tmp_path, 0o644)
+            os.replace(self.tmp_path, dest_path)
+        return f"{self.uploader.base_url}/{object_name}"
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
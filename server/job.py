@@ -0,0 +1,159 @@
+import copy
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Callable, Dict, Optional
+
+from server import const
+from server.base import Context
+
+
+class JobStatus(Enum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """
+    排队的任务已满
+    """
+    pass
+
+
+class Job:
+    """
+    一个排队执行的任务, 进度来自 Context.progress
+    """
+    task_ctx: Context
+    status: JobStatus
+    result: Optional[Dict]
+    error: Optional[str]
+
+    def __init__(self, task_ctx: Context, fn: Callable, args: tuple):
+        self.task_ctx = task_ctx
+        self.fn = fn
+        self.args = args
+        self.status = JobStatus.PENDING
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def task_uid(self):
+        return self.task_ctx.task_uid
+
+    def to_dict(self, with_result=True) -> Dict:
+        data = {
+            "task_uid": self.task_uid,
+            "task_type": self.task_ctx.task_type,
+            "status": self.status.value,
+            "progress": self.task_ctx.progress_snapshot(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error:
+            data["error"] = self.error
+        if with_result and self.result is not None:
+            # 批量任务的结果与 progress['batch'] 是同一个对象
+            with self.task_ctx.lock:
+                data["result"] = copy.deepcopy(self.result)
+        return data
+
+
+class JobManager:
+    """
+    进程内的有界任务队列
+    固定数量的工作线程执行任务, 结果保存在内存中并落盘到 {result_dir}/{task_uid}/result.json
+    (result_dir 不对外提供访问, 结果只能通过 get 查询),
+    内存中只保留最近 keep_finished 个已完成的任务
+    """
+
+    def __init__(self, workers: int = const.JOB_WORKERS, queue_size: int = const.JOB_QUEUE_SIZE,
+                 keep_finished: int = const.JOB_KEEP_FINISHED, result_dir: str = const.JOB_RESULT_DIR):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.keep_finished = keep_finished
+        self.result_dir = result_dir
+        self.jobs: Dict[str, Job] = {}
+        self.finished: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._work, name=f"pic-trans-job-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, task_ctx: Context, fn: Callable, *args) -> Job:
+        """
+        提交任务, 队列已满时抛出 JobQueueFull
+        """
+        job = Job(task_ctx, fn, args)
+        with self.lock:
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                raise JobQueueFull(f"too many pending jobs: {self.queue.qsize()}")
+            self.jobs[job.task_uid] = job
+        return job
+
+    def get(self, task_uid: str) -> Optional[Dict]:
+        with self.lock:
+            job = self.jobs.get(task_uid)
+        if job is not None:
+            return job.to_dict()
+
+        # 已经从内存中淘汰, 从结果文件中读取
+        if os.path.basename(task_uid) != task_uid or task_uid in ('', '.', '..'):
+            return None
+        result_file = self.result_file(task_uid)
+        if not os.path.exists(result_file):
+            return None
+        with open(result_file, 'r') as f:
+            return json.load(f)
+
+    def pending(self) -> int:
+        return self.queue.qsize()
+
+    def result_file(self, task_uid: str) -> str:
+        return os.path.join(self.result_dir, task_uid, 'result.json')
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = job.fn(job.task_ctx, *job.args)
+                job.status = JobStatus.SUCCESS
+            except Exception as e:
+                job.error = str(e)
+                job.status = JobStatus.FAILED
+            job.finished_at = time.time()
+
+            try:
+                self._save(job)
+            except Exception as e:
+                print(f"save job {job.task_uid} failed: {e}")
+            self._finish(job)
+            self.queue.task_done()
+
+    def _save(self, job: Job):
+        result_file = self.result_file(job.task_uid)
+        os.makedirs(os.path.dirname(result_file), exist_ok=True)
+        with open(result_file, 'w') as f:
+            json.dump(job.to_dict(), f)
+
+    def _finish(self, job: Job):
+        with self.lock:
+            self.finished[job.task_uid] = job
+            while len(self.finished) > self.keep_finished:
+                task_uid, _ = self.finished.popitem(last=False)
+                self.jobs.pop(task_uid, None)
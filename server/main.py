@@ -1,16 +1,24 @@
+import asyncio
+import json
 import os
-import tempfile
+from typing import List
 from uuid import uuid4
 
 import anyio
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from starlette.staticfiles import StaticFiles
 
-from server import Context, PicTransTask
+from server import Context, PicTransTask, const
+from server.common.limits import Admission, CircuitOpen, Overloaded, stage_limits
+from server.common.metrics import metrics_text
 from server.const import UPLOADS_DIR
+from server.files.multipart import BadUpload, MultipartUpload
 from server.files.uploader import Uploader
+from server.job import JobManager, JobQueueFull
+from server.ocr.registry import model_registry
 
 host='127.0.0.1'
 port=8000
@@ -24,37 +32,74 @@ app.add_middleware(
     allow_headers=["*"],              # 允许的请求头
 )
 task_processor = PicTransTask()
+job_manager = JobManager()
+admission = Admission(const.MAX_RUNNING, const.MAX_WAITING)
 
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 # 静态资源路由，用于访问上传的图片
 app.mount("/static", StaticFiles(directory=UPLOADS_DIR), name="static")
 
 uploader = Uploader(base_dir=UPLOADS_DIR, base_url=f'http://{host}:{port}/static')
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def retry_later(e: Exception) -> HTTPException:
+    """
+    满载返回 429, 排队已满或熔断返回 503, 都带上 Retry-After
+    """
+    status_code = 429 if isinstance(e, Overloaded) else 503
+    retry_after = getattr(e, 'retry_after', const.RETRY_AFTER)
+    return HTTPException(status_code=status_code, detail=str(e), headers={"Retry-After": str(retry_after)})
+
 
 # 请求体模型
 class TranslateImageInput(BaseModel):
     to_lan: str
     from_lan: str
     image_url: str
+    async_mode: bool = False  # 异步任务模式: 立即返回 task_uid, 通过 /tasks/{task_uid} 查询结果
 
-@app.post("/upload_image")
-async def upload_image(image: UploadFile = File(...)):
-    try:
-        ext = os.path.splitext(image.filename)[-1].lower().strip(".") or "png"
-        object_name = f"images/{uuid4().hex}.{ext}"
+@app.on_event("startup")
+async def warmup():
+    # 后台预加载模型, 通过 /ready 查看是否加载完成
+    task_processor.start_warmup(const.WARMUP_LANS, const.WARMUP_INPAINT)
 
-        # 写入临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}") as tmp:
-            tmp.write(await image.read())
-            tmp_path = tmp.name
 
-        # 上传并删除临时文件
-        image_url = uploader.upload_file(tmp_path, object_name)
-        os.remove(tmp_path)
+@app.get("/ready")
+async def ready():
+    readiness = task_processor.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.post("/upload_image")
+async def upload_image(request: Request):
+    """
+    multipart/form-data 的 image 字段
+    直接解析请求体, 边接收边写入最终位置(不经过 UploadFile 的临时文件), 以内容 hash 命名, 重复上传直接返回已有地址
+    """
+    try:
+        upload = await anyio.to_thread.run_sync(
+            MultipartUpload, request.headers.get("content-type", ""), uploader)
+    except BadUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        return {"image_url": image_url}
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            # 攒够一块再写, 减少切换线程的次数
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await anyio.to_thread.run_sync(upload.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await anyio.to_thread.run_sync(upload.write, bytes(buffer))
+        image_url = await anyio.to_thread.run_sync(upload.finish)
+    except BadUpload as e:
+        upload.abort()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        upload.abort()
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    return {"image_url": image_url}
 
 
 @app.post("/pic_trans")
@@ -63,15 +108,124 @@ async def translate_image(task_input: TranslateImageInput, request: Request):
         # 构造上下文
         ctx = Context(task_uid=f"{uuid4().hex}", task_type=f"pic_trans", oss_client=uploader)
 
+        if task_input.async_mode:
+            job = job_manager.submit(ctx, task_processor.run, task_input.dict())
+            return {"task_uid": job.task_uid, "status": job.status.value}
+
         # 执行任务
-        result = await anyio.to_thread.run_sync(task_processor.run, ctx, task_input.dict())
+        async with admission.admit():
+            result = await anyio.to_thread.run_sync(task_processor.run, ctx, task_input.dict())
 
         # 确保是 JSON 可序列化的
         return result
+    except (Overloaded, JobQueueFull, CircuitOpen) as e:
+        raise retry_later(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/pic_trans/stream")
+async def translate_image_stream(task_input: TranslateImageInput):
+    """
+    以 SSE 渐进式返回翻译结果: layout -> patch * N -> done, 出错时返回 error
+    """
+    try:
+        task_processor.get_provider(task_input.from_lan, task_input.to_lan)
+        admission.check()
+    except Overloaded as e:
+        raise retry_later(e)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ctx = Context(task_uid=f"{uuid4().hex}", task_type=f"pic_trans_stream", oss_client=uploader)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    async def produce():
+        try:
+            async with admission.admit():
+                await anyio.to_thread.run_sync(task_processor.run_stream, ctx, task_input.dict(), emit)
+        except Exception as e:
+            events.put_nowait(('error', {"detail": str(e)}))
+        finally:
+            events.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+
+    async def stream():
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            event, data = item
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        await producer
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Task-Uid": ctx.task_uid})
+
+
+class BatchTranslateImageInput(BaseModel):
+    to_lan: str
+    from_lan: str
+    image_urls: List[str]
+
+
+@app.post("/pic_trans/batch")
+async def translate_images(task_input: BatchTranslateImageInput):
+    """
+    批量翻译, 以异步任务执行, 通过 /tasks/{task_uid} 查看吞吐和已完成图片的结果
+    """
+    try:
+        task_processor.get_provider(task_input.from_lan, task_input.to_lan)
+        ctx = Context(task_uid=f"{uuid4().hex}", task_type=f"pic_trans_batch", oss_client=uploader)
+        job = job_manager.submit(ctx, task_processor.run_batch, task_input.dict())
+        return {"task_uid": job.task_uid, "status": job.status.value}
+    except JobQueueFull as e:
+        raise retry_later(e)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "result": task_processor.result_cache.stats(),
+        "ocr": task_processor.ocr_tool.stats(),
+        "translation": task_processor.translator.stats(),
+        "in_flight": task_processor.in_flight.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    content, content_type = metrics_text()
+    return Response(content=content, media_type=content_type)
+
+
+@app.get("/load")
+async def load_stats():
+    return {
+        "admission": admission.stats(),
+        "stages": stage_limits.stats(),
+        "jobs_pending": job_manager.pending(),
+        "ocr_models": model_registry.stats(),
+        "translate_batching": task_processor.translate_batcher.stats() if task_processor.translate_batcher else None,
+        "translator": task_processor.remote_translator.stats(),
+    }
+
+
+@app.get("/tasks/{task_uid}")
+async def get_task(task_uid: str):
+    job = job_manager.get(task_uid)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"task {task_uid} not found")
+    return job
+
+
 # ✅ 入口函数：直接运行 FastAPI 服务
 def main():
     import uvicorn
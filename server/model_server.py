@@ -0,0 +1,252 @@
+"""
+模型服务进程
+
+OCR 和擦图模型只在一个进程中加载, 多个 uvicorn worker 通过 multiprocessing.connection 调用,
+图片数组通过共享内存传递, 不经过 socket 序列化。
+
+启动: DOOMN_MODEL_SERVER_AUTHKEY=... python -m server.model_server --port 8500
+worker 设置环境变量 DOOMN_MODEL_SERVER=127.0.0.1:8500 和相同的 DOOMN_MODEL_SERVER_AUTHKEY 后使用模型服务
+
+连接上的请求用 pickle 反序列化, 能连上端口并且知道密钥就能在模型服务进程中执行任意代码,
+因此必须配置随机的密钥, 并且只监听本机或受信任的内网地址, 不能把端口暴露出去
+"""
+import argparse
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from server import const
+from server.base import Language, PicTransOcrBox
+from server.common.limits import stage_limits
+from server.ocr.base import OCR
+
+
+def check_authkey(authkey: bytes):
+    if not authkey:
+        raise Exception("DOOMN_MODEL_SERVER_AUTHKEY is required for the model server")
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def attach_shared_memory(name: str) -> SharedMemory:
+    """
+    打开其他进程创建的共享内存, 由创建方负责释放
+    """
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 会登记到 resource_tracker, 进程退出时误删其他进程的共享内存
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedArray:
+    """
+    在共享内存中创建一个 ndarray 的拷贝, 用完后调用 close 释放
+    """
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self.shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self.array = np.ndarray(self.shape, dtype=array.dtype, buffer=self.shm.buf)
+        self.array[...] = array
+
+    def ref(self) -> Tuple[str, tuple, str]:
+        return self.shm.name, self.shape, self.dtype
+
+    def close(self):
+        del self.array
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ModelServer:
+    """
+    加载 OCR 和擦图模型, 为每个连接启动一个线程处理请求
+    请求: (op, args), 响应: ('ok', result) 或 ('error', message)
+    """
+
+    def __init__(self, languages: List[Language]):
+        from server.ocr import local_ocr
+        self.ocr_tool = local_ocr(languages)
+        if const.OCR_BATCH_WINDOW_MS > 0:
+            # 合并各 worker 的并发请求
+            from server.ocr.batching import BatchingOcr
+            self.ocr_tool = BatchingOcr(self.ocr_tool)
+
+    def serve(self, address: Tuple[str, int], authkey: bytes = const.MODEL_SERVER_AUTHKEY):
+        check_authkey(authkey)
+        with Listener(address, authkey=authkey) as listener:
+            print(f"model server listening on {address[0]}:{address[1]}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(('ok', getattr(self, f"op_{op}")(*args)))
+                except Exception as e:
+                    conn.send(('error', f"{op} failed: {e}"))
+
+    def op_cache_id(self):
+        return self.ocr_tool.cache_id()
+
+    def op_ocr(self, image_ref, lan_trans: str, threshold: float):
+        name, shape, dtype = image_ref
+        shm = attach_shared_memory(name)
+        try:
+            image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            with stage_limits.slot('ocr'):
+                boxes = self.ocr_tool.ocr(image, Language.from_tran(lan_trans), threshold)
+            del image
+        finally:
+            shm.close()
+        return [(box.ocr_box, box.text) for box in boxes]
+
+    def op_inpaint(self, image_ref, masks_ref):
+        """
+        擦除结果写回 image 的共享内存, 尺寸变化时直接返回结果数组
+        """
+        from server.erase.batch_processing import batch_inpaint
+
+        image_shm = attach_shared_memory(image_ref[0])
+        masks_shm = attach_shared_memory(masks_ref[0])
+        try:
+            image = np.ndarray(image_ref[1], dtype=image_ref[2], buffer=image_shm.buf)
+            masks = np.ndarray(masks_ref[1], dtype=masks_ref[2], buffer=masks_shm.buf)
+            with stage_limits.slot('inpaint'):
+                result = np.array(batch_inpaint(Image.fromarray(image), [Image.fromarray(m) for m in masks]))
+            if result.shape == image.shape:
+                image[...] = result
+                result = None
+            del image, masks
+        finally:
+            image_shm.close()
+            masks_shm.close()
+        return result
+
+
+class ModelClient:
+    """
+    模型服务的客户端, 每个线程使用独立的连接
+    """
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes = const.MODEL_SERVER_AUTHKEY):
+        check_authkey(authkey)
+        self.address = address
+        self.authkey = authkey
+        self.local = threading.local()
+
+    def call(self, op: str, *args):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self.local.conn = conn
+        try:
+            conn.send((op, args))
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            # 模型服务重启后重新连接
+            self.local.conn = None
+            conn.close()
+            raise
+        if status != 'ok':
+            raise Exception(result)
+        return result
+
+    def ocr(self, image: np.ndarray, lan: Language, threshold: float):
+        shared = SharedArray(image)
+        try:
+            return self.call('ocr', shared.ref(), lan.trans, threshold)
+        finally:
+            shared.close()
+
+    def inpaint(self, image: Image, masks: [Image]) -> Image:
+        shared_image = SharedArray(np.array(image.convert('RGB')))
+        shared_masks = SharedArray(np.stack([np.array(m.convert('L')) for m in masks]))
+        try:
+            result = self.call('inpaint', shared_image.ref(), shared_masks.ref())
+            if result is None:
+                result = shared_image.array.copy()
+            return Image.fromarray(result)
+        finally:
+            shared_image.close()
+            shared_masks.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def model_client() -> ModelClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ModelClient(parse_address(const.MODEL_SERVER))
+    return _client
+
+
+class RemoteOcr(OCR):
+    """
+    使用模型服务进程中的 OCR 模型
+    """
+
+    def __init__(self, languages: [Language] = None):
+        super().__init__(languages)
+        # 启动时就检查密钥, 而不是在第一次请求时
+        check_authkey(const.MODEL_SERVER_AUTHKEY)
+
+    def cache_id(self) -> str:
+        # 识别结果由模型服务中的 ocr 决定, 每次查询, 模型服务换了配置重启后缓存随之失效
+        return f"{super().cache_id()}:{model_client().call('cache_id')}"
+
+    def ocr(self, image: np.ndarray, lan: Language, threshold=0.85) -> List[PicTransOcrBox]:
+        orc_boxes = []
+        for ocr_box, text in model_client().ocr(image, lan, threshold):
+            orc_box = PicTransOcrBox(lan)
+            orc_box.ocr_box = ocr_box
+            orc_box.text = text
+            orc_boxes.append(orc_box)
+        return orc_boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="doomn model server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--lans", default="zh,en,kor,jp,cht", help="支持的 OCR 语言, 逗号分隔")
+    parser.add_argument("--warmup", default=",".join(const.WARMUP_LANS), help="启动时预加载的 OCR 语言, 逗号分隔")
+    args = parser.parse_args()
+    if not const.MODEL_SERVER_AUTHKEY:
+        parser.error("environment variable DOOMN_MODEL_SERVER_AUTHKEY is required")
+
+    languages = [Language.from_tran(lan) for lan in args.lans.split(',')]
+    server = ModelServer([lan for lan in languages if lan])
+    for lan in [Language.from_tran(lan) for lan in args.warmup.split(',')]:
+        if lan:
+            server.ocr_tool.warmup(lan)
+    if const.WARMUP_INPAINT:
+        from server.erase.batch_processing import get_model_manager
+        get_model_manager()
+    server.serve((args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,14 @@
+from server import const
 
+
+def local_ocr(languages=None, backend: str = const.OCR_BACKEND):
+    """
+    在本进程中加载模型的 ocr, backend: paddle 或 onnx
+    """
+    if backend == 'onnx':
+        from server.ocr.onnx_ocr import OnnxOcr
+        return OnnxOcr(languages)
+    if backend == 'paddle':
+        from server.ocr.paddle_ocr import PaddleOcr
+        return PaddleOcr(languages)
+    raise Exception(f"unknown ocr backend: {backend}")
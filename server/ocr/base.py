@@ -7,6 +7,8 @@ DEFAULT_LAN = Language.CHINESE
 
 class OCR(object):
     languages: [Language]
+    # 前后处理的修改会改变识别结果时加 1, 使已有的 ocr 缓存失效
+    cache_version = 1
 
     def __init__(self, languages: [Language] = None):
         if languages is None:
@@ -15,3 +17,23 @@ class OCR(object):
 
     def ocr(self, image, lan: Language, threshold=0.8) -> List[PicTransOcrBox]:
         pass
+
+    def ocr_batch(self, images: list, lan: Language, threshold=0.8) -> List[List[PicTransOcrBox]]:
+        """
+        识别多张图片, 按输入顺序返回每张图片的结果
+        """
+        return [self.ocr(image, lan, threshold) for image in images]
+
+    def cache_id(self) -> str:
+        """
+        标识识别结果的实现和参数, 作为 ocr 缓存 key 的一部分
+        影响识别结果的参数都要包含在内, 包装其它 ocr 的实现需要包含被包装 ocr 的 cache_id
+        """
+        return f"{type(self).__name__}:v{self.cache_version}"
+
+    def warmup(self, lan: Language):
+        """
+        加载模型, 并用一张空白图片执行一次推理
+        """
+        import numpy as np
+        self.ocr(np.full((64, 256, 3), 255, dtype=np.uint8), lan)
@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+from server import const
+from server.base import Language, PicTransOcrBox
+from server.ocr.base import OCR
+
+
+class _Pending:
+    def __init__(self, image, lan: Language, threshold):
+        self.image = image
+        self.lan = lan
+        self.threshold = threshold
+        self.future = Future()
+
+
+class BatchingOcr(OCR):
+    """
+    合并并发请求的 ocr
+    第一个请求到达后最多等待 window_ms 毫秒或凑够 max_batch 张图片, 相同语言和阈值的图片
+    一起调用被包装 ocr 的 ocr_batch, 文字行跨图片组成识别批次
+    """
+
+    def __init__(self, ocr_tool: OCR, window_ms: int = const.OCR_BATCH_WINDOW_MS,
+                 max_batch: int = const.OCR_BATCH_SIZE):
+        super().__init__(ocr_tool.languages)
+        self.ocr_tool = ocr_tool
+        self.window = window_ms / 1000
+        self.max_batch = max(max_batch, 1)
+        self.pending: List[_Pending] = []
+        self.cond = threading.Condition()
+        self.batches = 0
+        self.images = 0
+        threading.Thread(target=self._work, name="ocr-batching", daemon=True).start()
+
+    def ocr(self, image, lan: Language, threshold=0.85) -> List[PicTransOcrBox]:
+        item = _Pending(image, lan, threshold)
+        with self.cond:
+            self.pending.append(item)
+            self.cond.notify()
+        return item.future.result()
+
+    def ocr_batch(self, images: list, lan: Language, threshold=0.85) -> List[List[PicTransOcrBox]]:
+        return self.ocr_tool.ocr_batch(images, lan, threshold)
+
+    def cache_id(self) -> str:
+        return self.ocr_tool.cache_id()
+
+    def warmup(self, lan: Language):
+        self.ocr_tool.warmup(lan)
+
+    def _take(self) -> List[_Pending]:
+        with self.cond:
+            while not self.pending:
+                self.cond.wait()
+            deadline = time.monotonic() + self.window
+            while len(self.pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            items = self.pending[:self.max_batch]
+            del self.pending[:self.max_batch]
+            return items
+
+    def _work(self):
+        while True:
+            items = self._take()
+            groups: Dict[tuple, List[_Pending]] = {}
+            for item in items:
+                groups.setdefault((item.lan, item.threshold), []).append(item)
+
+            for (lan, threshold), group in groups.items():
+                try:
+                    results = self.ocr_tool.ocr_batch([item.image for item in group], lan, threshold)
+                except Exception as e:
+                    for item in group:
+                        item.future.set_exception(e)
+                    continue
+                for item, boxes in zip(group, results):
+                    item.future.set_result(boxes)
+                with self.cond:
+                    self.batches += 1
+                    self.images += len(group)
+
+    def stats(self) -> Dict:
+        with self.cond:
+            return {
+                "batches": self.batches,
+                "images": self.images,
+                "avg_batch": round(self.images / self.batches, 2) if self.batches else 0,
+                "pending": len(self.pending),
+            }
@@ -0,0 +1,88 @@
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+from server import const
+from server.base import Language, PicTransOcrBox
+from server.common.cache import DiskLRUCache, LRUCache, make_key
+from server.ocr.base import OCR
+
+
+def array_hash(image) -> str:
+    m = hashlib.sha256()
+    m.update(f"{image.dtype.str}:{image.shape}:".encode('utf-8'))
+    m.update(image.tobytes())
+    return m.hexdigest()
+
+
+class CachedOcr(OCR):
+    """
+    缓存 ocr 识别结果, key 为 图片内容hash + ocr语言 + 阈值 + 被包装 ocr 的 cache_id(实现和参数)
+    先查内存 LRU, 再查磁盘 LRU(可选), 都未命中时调用被包装的 ocr
+    缓存的是文字区域和文本, 每次返回新的 PicTransOcrBox, 后续处理可以放心修改
+    """
+
+    def __init__(self, ocr_tool: OCR, max_entries: int = const.OCR_CACHE_ENTRIES,
+                 disk_dir: Optional[str] = os.path.join(const.CACHE_DIR, 'ocr'),
+                 disk_bytes: int = const.OCR_CACHE_DISK_MB * 1024 * 1024):
+        super().__init__(ocr_tool.languages)
+        self.ocr_tool = ocr_tool
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskLRUCache(disk_dir, disk_bytes) if disk_dir and disk_bytes > 0 else None
+
+    def key(self, image, lan: Language, threshold) -> str:
+        return make_key(array_hash(image), lan.ocr, threshold, self.ocr_tool.cache_id())
+
+    def lookup(self, key: str) -> Optional[list]:
+        items = self.memory.get(key)
+        if items is None and self.disk is not None:
+            items = self.disk.get(key)
+            if items is not None:
+                self.memory.put(key, items)
+        return items
+
+    def store(self, key: str, boxes: List[PicTransOcrBox]) -> list:
+        items = [([[float(x), float(y)] for x, y in box.ocr_box], box.text) for box in boxes or []]
+        self.memory.put(key, items)
+        if self.disk is not None:
+            self.disk.put(key, items)
+        return items
+
+    @staticmethod
+    def to_boxes(items: list, lan: Language) -> List[PicTransOcrBox]:
+        orc_boxes = []
+        for ocr_box, text in items:
+            orc_box = PicTransOcrBox(lan)
+            orc_box.ocr_box = [list(point) for point in ocr_box]
+            orc_box.text = text
+            orc_boxes.append(orc_box)
+        return orc_boxes
+
+    def ocr(self, image, lan: Language, threshold=0.85) -> List[PicTransOcrBox]:
+        key = self.key(image, lan, threshold)
+        items = self.lookup(key)
+        if items is None:
+            items = self.store(key, self.ocr_tool.ocr(image, lan, threshold))
+        return self.to_boxes(items, lan)
+
+    def ocr_batch(self, images: list, lan: Language, threshold=0.85) -> List[List[PicTransOcrBox]]:
+        """
+        只有未命中缓存的图片送入被包装的 ocr 批量识别
+        """
+        keys = [self.key(image, lan, threshold) for image in images]
+        results = [self.lookup(key) for key in keys]
+        missed = [i for i, items in enumerate(results) if items is None]
+        if missed:
+            batch = self.ocr_tool.ocr_batch([images[i] for i in missed], lan, threshold)
+            for i, boxes in zip(missed, batch):
+                results[i] = self.store(keys[i], boxes)
+        return [self.to_boxes(items, lan) for items in results]
+
+    def warmup(self, lan: Language):
+        self.ocr_tool.warmup(lan)
+
+    def stats(self) -> Dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
@@ -0,0 +1,283 @@
+"""
+使用 ONNX Runtime 推理 PP-OCR 模型, 不依赖 paddle, 内存占用和启动耗时都更小
+
+模型由 paddle2onnx 从 PaddleOCR 的推理模型转换, 放在 OCR_ONNX_DIR 目录下:
+    det.onnx                检测模型(所有语言共用)
+    cls.onnx                方向分类模型
+    rec_{lan.ocr}.onnx      识别模型, eg: rec_ch.onnx, rec_japan.onnx
+    {lan.ocr}_dict.txt      识别模型的字典, eg: ch_dict.txt
+开启 int8 量化时, 第一次加载会生成 *.int8.onnx
+"""
+import math
+import os
+from typing import Dict, List
+
+import numpy as np
+
+from server import const
+from server.base import Language
+from server.ocr.base import OCR, PicTransOcrBox
+from server.ocr.registry import model_registry
+
+
+def create_session(model_path: str, threads: int = const.OCR_ONNX_THREADS, int8: bool = const.OCR_ONNX_INT8):
+    import onnxruntime as ort
+
+    if int8:
+        quantized = model_path[:-len('.onnx')] + '.int8.onnx'
+        if not os.path.exists(quantized):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(model_path, quantized, weight_type=QuantType.QUInt8)
+        model_path = quantized
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads > 0:
+        options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+def run_session(session, data: np.ndarray) -> np.ndarray:
+    return session.run(None, {session.get_inputs()[0].name: data})[0]
+
+
+def order_points(points: np.ndarray) -> np.ndarray:
+    """
+    按 左上、右上、右下、左下 排列四个顶点
+    """
+    points = sorted(points.tolist(), key=lambda p: p[0])
+    left = sorted(points[:2], key=lambda p: p[1])
+    right = sorted(points[2:], key=lambda p: p[1])
+    return np.array([left[0], right[0], right[1], left[1]], dtype=np.float32)
+
+
+def sorted_boxes(dt_boxes: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    从上到下、从左到右排序, 纵坐标相差 10 像素以内的视为同一行(与 PaddleOCR 一致)
+    """
+    boxes = sorted(dt_boxes, key=lambda b: (b[0][1], b[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def rotate_crop(image: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    透视变换裁剪文字行, 竖排的文字行旋转为横排(与 PaddleOCR 的 get_rotate_crop_image 一致)
+    """
+    import cv2
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    width, height = max(width, 1), max(height, 1)
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points.astype(np.float32), target)
+    crop = cv2.warpPerspective(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE,
+                               flags=cv2.INTER_CUBIC)
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+class OnnxOcr(OCR):
+    """
+    PP-OCR 的检测、方向分类、识别三个模型用 ONNX Runtime 推理, 前后处理与 PaddleOCR 的默认参数一致:
+    检测 DB 后处理(thresh 0.3, box_thresh 0.6, unclip_ratio 1.5), 识别 CTC 贪心解码
+    """
+    dictionaries = {}
+
+    def __init__(self, languages: [Language] = None, model_dir: str = const.OCR_ONNX_DIR,
+                 det_long_side: int = const.OCR_DET_LONG_SIDE, rec_batch: int = const.OCR_REC_BATCH):
+        super().__init__(languages)
+        self.model_dir = model_dir
+        self.det_long_side = det_long_side if det_long_side > 0 else 960
+        self.rec_batch = max(rec_batch, 1)
+
+    def session(self, name: str, pinned: bool = True):
+        path = os.path.join(self.model_dir, f"{name}.onnx")
+        return model_registry.get(f"onnx:{name}", lambda: create_session(path), pinned=pinned)
+
+    def load(self, lan: Language):
+        """
+        返回 lan 的识别模型和字符表(下标 0 为 CTC blank, 末尾为空格), 识别模型由 model_registry 按内存预算管理
+        """
+        if lan not in self.languages:
+            raise Exception(f"ocr not support language: {lan.ocr}")
+
+        session = self.session(f"rec_{lan.ocr}", pinned=False)
+        if lan.ocr not in self.dictionaries:
+            with open(os.path.join(self.model_dir, f"{lan.ocr}_dict.txt"), 'r', encoding='utf-8') as f:
+                chars = [line.rstrip('\r\n') for line in f]
+            self.dictionaries[lan.ocr] = ['blank'] + chars + [' ']
+        return session, self.dictionaries[lan.ocr]
+
+    def cache_id(self) -> str:
+        return f"{super().cache_id()}:{self.model_dir}:{self.det_long_side}:{self.rec_batch}:{const.OCR_ONNX_INT8}"
+
+    def loaded(self) -> List[str]:
+        return model_registry.loaded()
+
+    @staticmethod
+    def preprocess(image: np.ndarray) -> np.ndarray:
+        if image.ndim == 2:
+            import cv2
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        if image.shape[2] == 4:
+            return image[:, :, :3]
+        return image
+
+    def detect(self, image: np.ndarray) -> List[np.ndarray]:
+        import cv2
+
+        height, width = image.shape[:2]
+        scale = min(self.det_long_side / max(height, width), 1.0)
+        resize_h = max(int(round(height * scale / 32)) * 32, 32)
+        resize_w = max(int(round(width * scale / 32)) * 32, 32)
+        data = cv2.resize(image, (resize_w, resize_h)).astype(np.float32)
+        data = (data / 255.0 - np.array([0.485, 0.456, 0.406], dtype=np.float32)) \
+            / np.array([0.229, 0.224, 0.225], dtype=np.float32)
+        pred = run_session(self.session('det'), data.transpose(2, 0, 1)[np.newaxis])[0, 0]
+
+        boxes = self.db_postprocess(pred, width / resize_w, height / resize_h, width, height)
+        return sorted_boxes(boxes)
+
+    @staticmethod
+    def db_postprocess(pred: np.ndarray, ratio_w: float, ratio_h: float, width: int, height: int,
+                       thresh=0.3, box_thresh=0.6, unclip_ratio=1.5, min_size=3, max_candidates=1000):
+        import cv2
+
+        bitmap = (pred > thresh).astype(np.uint8)
+        contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours[:max_candidates]:
+            rect = cv2.minAreaRect(contour)
+            if min(rect[1]) < min_size:
+                continue
+
+            # 文字区域内概率的平均值
+            points = cv2.boxPoints(rect)
+            x0, y0 = np.clip(np.floor(points.min(axis=0)).astype(int), 0, [pred.shape[1] - 1, pred.shape[0] - 1])
+            x1, y1 = np.clip(np.ceil(points.max(axis=0)).astype(int), 0, [pred.shape[1] - 1, pred.shape[0] - 1])
+            mask = np.zeros((y1 - y0 + 1, x1 - x0 + 1), dtype=np.uint8)
+            cv2.fillPoly(mask, [(points - [x0, y0]).astype(np.int32)], 1)
+            if cv2.mean(pred[y0:y1 + 1, x0:x1 + 1], mask)[0] < box_thresh:
+                continue
+
+            # 按 面积 * unclip_ratio / 周长 向外扩展, 矩形时与 pyclipper 的结果一致
+            w, h = rect[1]
+            distance = w * h * unclip_ratio / (2 * (w + h))
+            expanded = (rect[0], (w + 2 * distance, h + 2 * distance), rect[2])
+            if min(expanded[1]) < min_size + 2:
+                continue
+
+            box = order_points(cv2.boxPoints(expanded))
+            box[:, 0] = np.clip(np.round(box[:, 0] * ratio_w), 0, width - 1)
+            box[:, 1] = np.clip(np.round(box[:, 1] * ratio_h), 0, height - 1)
+            if np.linalg.norm(box[0] - box[1]) <= 3 or np.linalg.norm(box[0] - box[3]) <= 3:
+                continue
+            boxes.append(box)
+        return boxes
+
+    @staticmethod
+    def normalize_line(crop: np.ndarray, height: int, max_width: int) -> np.ndarray:
+        """
+        按比例缩放到 height 高, 宽度不超过 max_width, 右侧补 0
+        """
+        import cv2
+        resized_w = min(max_width, int(math.ceil(height * crop.shape[1] / max(crop.shape[0], 1))))
+        resized = cv2.resize(crop, (max(resized_w, 1), height)).astype(np.float32)
+        resized = (resized / 255.0 - 0.5) / 0.5
+        data = np.zeros((3, height, max_width), dtype=np.float32)
+        data[:, :, :resized.shape[1]] = resized.transpose(2, 0, 1)
+        return data
+
+    def classify(self, crops: List[np.ndarray], thresh=0.9) -> List[np.ndarray]:
+        """
+        方向分类, 倒置的文字行旋转 180 度
+        """
+        if not crops:
+            return crops
+        session = self.session('cls')
+        crops = list(crops)
+        for start in range(0, len(crops), self.rec_batch):
+            batch = crops[start:start + self.rec_batch]
+            data = np.stack([self.normalize_line(crop, 48, 192) for crop in batch])
+            probs = run_session(session, data)
+            for i, prob in enumerate(probs):
+                if prob.argmax() == 1 and prob[1] > thresh:
+                    crops[start + i] = np.rot90(batch[i], 2)
+        return crops
+
+    def recognize(self, lan: Language, crops: List[np.ndarray]) -> list:
+        """
+        文字识别, 按宽高比排序后分批推理, CTC 贪心解码, 返回 [(text, score)]
+        """
+        if not crops:
+            return []
+        session, chars = self.load(lan)
+        ratios = [crop.shape[1] / max(crop.shape[0], 1) for crop in crops]
+        order = np.argsort(ratios)
+        results = [('', 0.0)] * len(crops)
+        for start in range(0, len(crops), self.rec_batch):
+            indices = order[start:start + self.rec_batch]
+            max_ratio = max(max(ratios[i] for i in indices), 320 / 48)
+            max_width = int(math.ceil(48 * max_ratio))
+            data = np.stack([self.normalize_line(crops[i], 48, max_width) for i in indices])
+            probs = run_session(session, data)
+            for i, prob in zip(indices, probs):
+                results[i] = self.ctc_decode(prob, chars)
+        return results
+
+    @staticmethod
+    def ctc_decode(prob: np.ndarray, chars: List[str]):
+        labels = prob.argmax(axis=1)
+        scores = prob.max(axis=1)
+        keep = labels != 0
+        keep[1:] &= labels[1:] != labels[:-1]
+        text = ''.join(chars[label] for label in labels[keep] if label < len(chars))
+        score = float(scores[keep].mean()) if keep.any() else 0.0
+        return text, score
+
+    @staticmethod
+    def to_boxes(dt_boxes: list, rec_res: list, lan: Language, threshold) -> List[PicTransOcrBox]:
+        orc_boxes = []
+        for box, (text, score) in zip(dt_boxes, rec_res):
+            if score < threshold:
+                continue
+
+            orc_box = PicTransOcrBox(lan)
+            orc_box.ocr_box = box.tolist()
+            orc_box.text = text
+            orc_boxes.append(orc_box)
+        return orc_boxes
+
+    def ocr(self, image: np.ndarray, lan: Language, threshold=0.85) -> List[PicTransOcrBox]:
+        return self.ocr_batch([image], lan, threshold)[0]
+
+    def ocr_batch(self, images: List[np.ndarray], lan: Language, threshold=0.85) -> List[List[PicTransOcrBox]]:
+        self.load(lan)
+        images = [self.preprocess(image) for image in images]
+        all_boxes, all_crops = [], []
+        for image in images:
+            dt_boxes = self.detect(image)
+            all_boxes.append(dt_boxes)
+            all_crops.extend(rotate_crop(image, box) for box in dt_boxes)
+
+        rec_res = self.recognize(lan, self.classify(all_crops))
+
+        results = []
+        offset = 0
+        for dt_boxes in all_boxes:
+            results.append(self.to_boxes(dt_boxes, rec_res[offset:offset + len(dt_boxes)], lan, threshold))
+            offset += len(dt_boxes)
+        return results
+
+    def ocr_multi(self, image: np.ndarray, lans: List[Language], threshold=0.85) -> Dict[Language, List[PicTransOcrBox]]:
+        image = self.preprocess(image)
+        dt_boxes = self.detect(image)
+        crops = self.classify([rotate_crop(image, box) for box in dt_boxes])
+        return {lan: self.to_boxes(dt_boxes, self.recognize(lan, crops), lan, threshold) for lan in lans}
@@ -1,37 +1,179 @@
-from typing import List
+from typing import Dict, List
 
+from server import const
 from server.base import Language
 from server.ocr.base import OCR, PicTransOcrBox
+from server.ocr.registry import model_registry
 
 
 class PaddleOcr(OCR):
+    """
+    文字检测和方向分类与语言无关, 所有语言共用一个检测模型和方向分类模型(shared),
+    每种语言只加载各自的识别模型
+    """
     from numpy import ndarray
-    # Paddleocr目前支持的多语言语种可以通过修改lang参数进行切换
-    # 例如`ch`, `en`, `fr`, `german`, `korean`, `japan`
-    paddle_ocrs = {}
 
-    def __init__(self, languages: [Language] = None):
+    def __init__(self, languages: [Language] = None, det_long_side: int = const.OCR_DET_LONG_SIDE):
+        # 模型在第一次使用时加载, 需要预加载时调用 warmup
         super().__init__(languages)
+        # 文字检测前将图片长边缩小到 det_long_side, 0 表示使用原图
+        self.det_long_side = det_long_side
 
-        for lan in self.languages:
-            self.load(lan)
+    def load_shared(self):
+        """
+        加载共用的检测和方向分类模型, 它的识别模型同时作为 OCR_DET_LAN 语言的识别模型
+        检测模型的尺寸限制与 det_long_side 一致, 不同 det_long_side 的实例使用各自的模型
+        """
+
+        def loader():
+            from paddleocr import PaddleOCR
+            kwargs = {}
+            if self.det_long_side > 0:
+                # 检测模型按缩小后的尺寸推理, 不再放大或缩小
+                kwargs = {'det_limit_side_len': self.det_long_side, 'det_limit_type': 'max'}
+            return PaddleOCR(use_angle_cls=True, lang=const.OCR_DET_LAN, rec_batch_num=const.OCR_REC_BATCH, **kwargs)
+
+        name = f"paddle:{const.OCR_DET_LAN}"
+        if self.det_long_side != const.OCR_DET_LONG_SIDE:
+            name = f"{name}:det{self.det_long_side}"
+        return model_registry.get(name, loader, pinned=True)
 
     def load(self, lan: Language):
-        if lan.ocr not in self.paddle_ocrs.items():
+        """
+        返回 lan 的识别模型, 由 model_registry 按内存预算管理
+        """
+        if lan not in self.languages:
+            raise Exception(f"ocr not support language: {lan.ocr}")
+        if lan.ocr == const.OCR_DET_LAN:
+            return self.load_shared()
 
+        def loader():
             from paddleocr import PaddleOCR
-            self.paddle_ocrs[lan.ocr] = PaddleOCR(use_angle_cls=True, lang=lan.ocr)
+            # Paddleocr目前支持的多语言语种可以通过修改lang参数进行切换
+            # 例如`ch`, `en`, `fr`, `german`, `korean`, `japan`
+            orc_tool = PaddleOCR(use_angle_cls=False, lang=lan.ocr, rec_batch_num=const.OCR_REC_BATCH)
+            # 只保留识别模型, 检测使用共用的模型
+            orc_tool.text_detector = None
+            return orc_tool
 
-    def ocr(self, image: ndarray, lan: Language, threshold=0.85) -> List[PicTransOcrBox]:
+        self.load_shared()
+        return model_registry.get(f"paddle:{lan.ocr}", loader)
+
+    def cache_id(self) -> str:
+        return f"{super().cache_id()}:{const.OCR_DET_LAN}:{self.det_long_side}:{const.OCR_REC_BATCH}"
+
+    def loaded(self) -> List[str]:
+        return model_registry.loaded()
+
+    @staticmethod
+    def preprocess(image: ndarray) -> ndarray:
+        if image.ndim == 2:
+            import cv2
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        if image.shape[2] == 4:
+            return image[:, :, :3]
+        return image
+
+    def detect(self, image: ndarray) -> list:
+        """
+        检测文字区域, 按从上到下、从左到右排序
+        大图先缩小到 det_long_side 再检测, 检测框按比例还原到原图坐标, 识别仍然从原图裁剪,
+        检测耗时随缩放比例的平方下降
+        """
+        from tools.infer.predict_system import sorted_boxes
+
+        scale = 1.0
+        det_image = image
+        height, width = image.shape[:2]
+        if 0 < self.det_long_side < max(height, width):
+            import cv2
+            scale = self.det_long_side / max(height, width)
+            det_image = cv2.resize(image, (max(round(width * scale), 1), max(round(height * scale), 1)),
+                                   interpolation=cv2.INTER_AREA)
+
+        dt_boxes, _ = self.load_shared().text_detector(det_image)
+        if dt_boxes is None or len(dt_boxes) == 0:
+            return []
+        if scale != 1.0:
+            dt_boxes = [self.scale_box(box, scale, width, height) for box in dt_boxes]
+        return sorted_boxes(dt_boxes)
+
+    @staticmethod
+    def scale_box(box: ndarray, scale: float, width: int, height: int) -> ndarray:
+        import numpy as np
+        box = box.astype(np.float32) / scale
+        box[:, 0] = np.clip(box[:, 0], 0, width - 1)
+        box[:, 1] = np.clip(box[:, 1], 0, height - 1)
+        return box
+
+    def crop(self, image: ndarray, dt_boxes: list) -> List[ndarray]:
+        from tools.infer.utility import get_minarea_rect_crop, get_rotate_crop_image
+        if self.load_shared().args.det_box_type == 'quad':
+            return [get_rotate_crop_image(image, box.copy()) for box in dt_boxes]
+        return [get_minarea_rect_crop(image, box.copy()) for box in dt_boxes]
+
+    def classify(self, crops: List[ndarray]) -> List[ndarray]:
+        """
+        方向分类, 倒置的文字行旋转 180 度
+        """
+        if len(crops) == 0:
+            return crops
+        crops, _, _ = self.load_shared().text_classifier(crops)
+        return crops
+
+    @staticmethod
+    def recognize(orc_tool, crops: List[ndarray]) -> list:
+        """
+        文字识别, 返回 [(text, score)]
+        """
+        if len(crops) == 0:
+            return []
+        rec_res, _ = orc_tool.text_recognizer(crops)
+        return rec_res
+
+    @staticmethod
+    def to_boxes(dt_boxes: list, rec_res: list, lan: Language, threshold) -> List[PicTransOcrBox]:
         orc_boxes = []
-        orc_tool = self.paddle_ocrs[lan.ocr]
-        boxes = orc_tool.ocr(image, cls=True)
-        for box in boxes[0]:
-            if box[1][1] < threshold:
+        for box, (text, score) in zip(dt_boxes, rec_res):
+            if score < threshold:
                 continue
 
             orc_box = PicTransOcrBox(lan)
-            orc_box.ocr_box = box[0]
-            orc_box.text = box[1][0]
+            orc_box.ocr_box = box.tolist()
+            orc_box.text = text
             orc_boxes.append(orc_box)
         return orc_boxes
+
+    def ocr(self, image: ndarray, lan: Language, threshold=0.85) -> List[PicTransOcrBox]:
+        return self.ocr_batch([image], lan, threshold)[0]
+
+    def ocr_batch(self, images: List[ndarray], lan: Language, threshold=0.85) -> List[List[PicTransOcrBox]]:
+        """
+        每张图片单独做文字检测, 所有图片的文字行一起送入识别模型,
+        识别模型按宽高比排序后凑满批次, 再按图片拆分结果
+        """
+        orc_tool = self.load(lan)
+        images = [self.preprocess(image) for image in images]
+        all_boxes, all_crops = [], []
+        for image in images:
+            dt_boxes = self.detect(image)
+            all_boxes.append(dt_boxes)
+            all_crops.extend(self.crop(image, dt_boxes))
+
+        rec_res = self.recognize(orc_tool, self.classify(all_crops))
+
+        results = []
+        offset = 0
+        for dt_boxes in all_boxes:
+            results.append(self.to_boxes(dt_boxes, rec_res[offset:offset + len(dt_boxes)], lan, threshold))
+            offset += len(dt_boxes)
+        return results
+
+    def ocr_multi(self, image: ndarray, lans: List[Language], threshold=0.85) -> Dict[Language, List[PicTransOcrBox]]:
+        """
+        多语言混排的图片: 只检测和方向分类一次, 再用每种语言的识别模型识别
+        """
+        image = self.preprocess(image)
+        dt_boxes = self.detect(image)
+        crops = self.classify(self.crop(image, dt_boxes))
+        return {lan: self.to_boxes(dt_boxes, self.recognize(self.load(lan), crops), lan, threshold) for lan in lans}
@@ -0,0 +1,103 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+from server import const
+
+
+def current_rss() -> int:
+    """
+    当前进程的常驻内存(字节), 无法获取时返回 -1
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return -1
+
+
+class _Entry:
+    def __init__(self, model: Any, size: int, pinned: bool):
+        self.model = model
+        self.size = size
+        self.pinned = pinned
+
+
+class ModelRegistry:
+    """
+    按内存预算管理 ocr 模型
+    每个模型只加载一次, 加载前后的 RSS 差值作为模型大小(无法获取时使用 default_mb);
+    RSS 是整个进程的, 所以同一时间只加载一个模型, 避免并发加载时差值重复计算。
+    总大小超过 budget_mb 时淘汰最久未使用的模型; pinned 的模型(eg: 共用的检测模型)不会被淘汰。
+    被淘汰的模型如果还在使用, 用完后才会释放
+    """
+
+    def __init__(self, budget_mb: int = const.OCR_MODEL_BUDGET_MB, default_mb: int = const.OCR_MODEL_DEFAULT_MB):
+        self.budget = budget_mb * 1024 * 1024
+        self.default_size = default_mb * 1024 * 1024
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_lock = threading.Lock()
+        self.lock = threading.Lock()
+
+    def get(self, name: str, loader: Callable[[], Any], pinned: bool = False) -> Any:
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None:
+                self.entries.move_to_end(name)
+                return entry.model
+
+        # 模型依次加载, 同一个模型只加载一次, 加载期间不影响其他已加载模型的使用
+        with self.load_lock:
+            with self.lock:
+                entry = self.entries.get(name)
+                if entry is not None:
+                    self.entries.move_to_end(name)
+                    return entry.model
+
+            before = current_rss()
+            model = loader()
+            after = current_rss()
+            size = after - before if before >= 0 and after > before else self.default_size
+
+            with self.lock:
+                self.entries[name] = _Entry(model, size, pinned)
+                self.size += size
+                self.loads += 1
+                print(f"ocr model {name} loaded, {size / 1024 / 1024:.0f}MB, total {self.size / 1024 / 1024:.0f}MB")
+                self._evict(keep=name)
+            return model
+
+    def _evict(self, keep: str):
+        if self.budget <= 0:
+            return
+        for name in list(self.entries):
+            if self.size <= self.budget:
+                break
+            entry = self.entries[name]
+            if entry.pinned or name == keep:
+                continue
+            del self.entries[name]
+            self.size -= entry.size
+            self.evictions += 1
+            print(f"ocr model {name} evicted, total {self.size / 1024 / 1024:.0f}MB")
+
+    def loaded(self):
+        with self.lock:
+            return list(self.entries)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "models": {name: round(entry.size / 1024 / 1024) for name, entry in self.entries.items()},
+                "size_mb": round(self.size / 1024 / 1024),
+                "budget_mb": round(self.budget / 1024 / 1024),
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+model_registry = ModelRegistry()
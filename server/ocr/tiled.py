@@ -0,0 +1,186 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from server import const
+from server.base import Language, PicTransOcrBox
+from server.ocr.base import OCR
+
+
+def tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+    """
+    一个方向上各切片的起点, 相邻切片重叠 overlap 像素, 最后一片与图片边缘对齐
+    """
+    if length <= tile:
+        return [0]
+    step = max(tile - overlap, 1)
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def box_rect(points) -> Tuple[float, float, float, float]:
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def rect_area(rect) -> float:
+    return max(rect[2] - rect[0], 0) * max(rect[3] - rect[1], 0)
+
+
+def rect_intersection(a, b) -> float:
+    return rect_area((max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])))
+
+
+def merge_text(a: str, b: str) -> str:
+    """
+    拼接被切开的两段文字, 去掉重叠区域中重复识别的部分
+    """
+    for n in range(min(len(a), len(b)), 0, -1):
+        if a.endswith(b[:n]):
+            return a + b[n:]
+    return a + b
+
+
+class _TileBox:
+    def __init__(self, box: PicTransOcrBox, cut: bool):
+        self.box = box
+        self.rect = box_rect(box.ocr_box)
+        # 文字框贴着切片的内侧边缘, 可能被切断
+        self.cut = cut
+
+
+class TiledOcr(OCR):
+    """
+    超长图片(eg: 790x20000 的详情页)切成互相重叠的切片并行识别, 再合并切缝处重复或被切断的文字框
+    直接识别整图时文字会被检测模型的尺寸上限压扁, 切片后每次识别的内存只和切片大小有关
+    重叠区域应大于最高的文字行, 保证每行文字至少完整出现在一个切片中
+    """
+
+    def __init__(self, ocr_tool: OCR, tile_size: int = const.OCR_TILE_SIZE,
+                 overlap: int = const.OCR_TILE_OVERLAP, ratio: float = const.OCR_TILE_RATIO,
+                 workers: int = const.OCR_TILE_WORKERS):
+        super().__init__(ocr_tool.languages)
+        self.ocr_tool = ocr_tool
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.ratio = ratio
+        self.executor = ThreadPoolExecutor(max(workers, 1), thread_name_prefix="ocr-tile")
+
+    def need_tile(self, image) -> bool:
+        height, width = image.shape[:2]
+        if self.tile_size <= 0 or max(height, width) <= self.tile_size:
+            return False
+        return max(height, width) / max(min(height, width), 1) >= self.ratio
+
+    def tiles(self, image) -> List[Tuple[int, int]]:
+        height, width = image.shape[:2]
+        return [(x, y) for y in tile_starts(height, self.tile_size, self.overlap)
+                for x in tile_starts(width, self.tile_size, self.overlap)]
+
+    def crop_tile(self, image, x: int, y: int):
+        import numpy as np
+        height, width = image.shape[:2]
+        return np.ascontiguousarray(image[y:min(y + self.tile_size, height), x:min(x + self.tile_size, width)])
+
+    def ocr(self, image, lan: Language, threshold=0.85) -> List[PicTransOcrBox]:
+        if not self.need_tile(image):
+            return self.ocr_tool.ocr(image, lan, threshold)
+
+        futures = [self.executor.submit(self.ocr_tile, image, x, y, lan, threshold) for x, y in self.tiles(image)]
+        boxes = []
+        for future in futures:
+            boxes.extend(future.result())
+        return self.merge(boxes)
+
+    def ocr_batch(self, images: list, lan: Language, threshold=0.85) -> List[List[PicTransOcrBox]]:
+        """
+        不需要切片的图片和各图片的切片一起交给被包装的 ocr 批量识别, 再按图片合并切片的结果
+        """
+        inputs = []
+        # 每张图片在 inputs 中的下标: 不切片时为一个下标, 切片时为 [(下标, x, y)]
+        layouts = []
+        for image in images:
+            if not self.need_tile(image):
+                layouts.append(len(inputs))
+                inputs.append(image)
+                continue
+            layout = []
+            for x, y in self.tiles(image):
+                layout.append((len(inputs), x, y))
+                inputs.append(self.crop_tile(image, x, y))
+            layouts.append(layout)
+
+        results = self.ocr_tool.ocr_batch(inputs, lan, threshold)
+        if len(inputs) == len(images):
+            return results
+        outputs = []
+        for image, layout in zip(images, layouts):
+            if isinstance(layout, int):
+                outputs.append(results[layout])
+                continue
+            boxes = []
+            for index, x, y in layout:
+                boxes.extend(self.tile_boxes(image, x, y, results[index]))
+            outputs.append(self.merge(boxes))
+        return outputs
+
+    def ocr_tile(self, image, x: int, y: int, lan: Language, threshold) -> List[_TileBox]:
+        return self.tile_boxes(image, x, y, self.ocr_tool.ocr(self.crop_tile(image, x, y), lan, threshold))
+
+    def tile_boxes(self, image, x: int, y: int, boxes: List[PicTransOcrBox]) -> List[_TileBox]:
+        """
+        切片中的文字框换算到原图坐标, 并标记是否可能被切断
+        """
+        height, width = image.shape[:2]
+        right, bottom = min(x + self.tile_size, width), min(y + self.tile_size, height)
+        margin = 2
+
+        tile_boxes = []
+        for box in boxes:
+            box.ocr_box = [[float(px) + x, float(py) + y] for px, py in box.ocr_box]
+            left_, top_, right_, bottom_ = box_rect(box.ocr_box)
+            cut = (x > 0 and left_ - x <= margin) or (y > 0 and top_ - y <= margin) \
+                or (right < width and right - right_ <= margin) or (bottom < height and bottom - bottom_ <= margin)
+            tile_boxes.append(_TileBox(box, cut))
+        return tile_boxes
+
+    def merge(self, tile_boxes: List[_TileBox]) -> List[PicTransOcrBox]:
+        """
+        重叠超过较小框一半面积的两个框视为同一行文字:
+        只有一个被切断时保留完整的框, 都被切断时合并为外接矩形, 都完整时保留面积大的框
+        """
+        merged: List[_TileBox] = []
+        for item in sorted(tile_boxes, key=lambda b: (b.rect[1], b.rect[0])):
+            for i, other in enumerate(merged):
+                inter = rect_intersection(item.rect, other.rect)
+                if inter <= 0 or inter < 0.5 * min(rect_area(item.rect), rect_area(other.rect)):
+                    continue
+                merged[i] = self.merge_pair(other, item)
+                break
+            else:
+                merged.append(item)
+        return [item.box for item in merged]
+
+    @staticmethod
+    def merge_pair(a: _TileBox, b: _TileBox) -> _TileBox:
+        if a.cut != b.cut:
+            return b if a.cut else a
+        if not a.cut:
+            return a if rect_area(a.rect) >= rect_area(b.rect) else b
+
+        # 按阅读顺序拼接文字
+        first, second = (a, b) if (a.rect[0], a.rect[1]) <= (b.rect[0], b.rect[1]) else (b, a)
+        left, top = min(a.rect[0], b.rect[0]), min(a.rect[1], b.rect[1])
+        right, bottom = max(a.rect[2], b.rect[2]), max(a.rect[3], b.rect[3])
+        box = PicTransOcrBox(first.box.from_lan)
+        box.ocr_box = [[left, top], [right, top], [right, bottom], [left, bottom]]
+        box.text = merge_text(first.box.text, second.box.text)
+        return _TileBox(box, True)
+
+    def cache_id(self) -> str:
+        # 切片参数决定了哪些图片切片以及合并后的结果
+        return f"{super().cache_id()}:{self.tile_size}:{self.overlap}:{self.ratio}/{self.ocr_tool.cache_id()}"
+
+    def warmup(self, lan: Language):
+        self.ocr_tool.warmup(lan)
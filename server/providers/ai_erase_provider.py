@@ -17,7 +17,7 @@ from server.engine import crop_boxes
 from server.erase.image_edit import edit_image
 from server.fabric.font_color import calculate_text_color
 from server.ocr.base import OCR
-from server.text.filter import is_number, is_weight, is_currency
+from server.text.filter import is_non_translatable
 from server.translate.base import Translate
 
 
@@ -40,13 +40,8 @@ class AiErasePicTransProvider:
     def text_process(self, ocr_boxes):
         result = []
         for box in ocr_boxes:
-            if is_number(box.text):
-                continue
-
-            if is_weight(box.text):
-                continue
-
-            if is_currency(box.text):
+            # 数字、重量、货币不翻译
+            if is_non_translatable(box.text):
                 continue
             result.append(box)
         return result
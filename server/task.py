@@ -0,0 +1,335 @@
+import json
+import os
+import threading
+import time
+from abc import ABC
+from typing import Callable, Dict, List, Optional
+from urllib.parse import unquote
+
+from psd2fabric.render.json_render import render_json
+
+from fabric_render.fabric_render.py_bridge import fabric_img
+from server import const
+from server.base import PicTransImage, Font, Language, Context, PContext
+from server.common.cache import DiskLRUCache, make_key
+from server.common.pipeline import PipelineItem, run_pipeline
+from server.common.singleflight import SingleFlight
+from server.common.utils import change_ext_to_filename, add_prefix_to_filename
+from server.engine import PicTransProvider, PROVIDERS, get_key, provider_register
+from server.ocr import local_ocr
+from server.ocr.batching import BatchingOcr
+from server.ocr.cache import CachedOcr
+from server.ocr.tiled import TiledOcr
+from server.providers.en.en_cht import ProviderEN_CHT
+from server.providers.en.en_de import ProviderEN_DE
+from server.providers.en.en_fra import ProviderEN_FRA
+from server.providers.en.en_jp import ProviderEN_JP
+from server.providers.en.en_kor import ProviderEN_KOR
+from server.providers.en.en_th import ProviderEN_TH
+from server.providers.en.en_vie import ProviderEN_VIE
+from server.providers.en.en_zh import ProviderEN_ZH
+from server.providers.zh.zh_cht import ProviderZH_CHT
+from server.providers.zh.zh_de import ProviderZH_DE
+from server.providers.zh.zh_en import ProviderZH_EN
+from server.providers.zh.zh_fra import ProviderZH_FRA
+from server.providers.zh.zh_jp import ProviderZH_JP
+from server.providers.zh.zh_kor import ProviderZH_KOR
+from server.providers.zh.zh_th import ProviderZH_TH
+from server.providers.zh.zh_vie import ProviderZH_VIE
+from server.translate.baidu import AsyncBaiduTranslator, BaiduTranslator
+from server.translate.batching import BatchingTranslator
+from server.translate.hedged import HedgedTranslator, backend_register, create_backends, parse_routes
+from server.translate.memory import TranslationMemory
+
+provider_register(ProviderZH_JP)
+provider_register(ProviderZH_EN)
+provider_register(ProviderZH_CHT)
+provider_register(ProviderZH_DE)
+provider_register(ProviderZH_FRA)
+provider_register(ProviderZH_KOR)
+provider_register(ProviderZH_TH)
+provider_register(ProviderZH_VIE)
+
+provider_register(ProviderEN_JP)
+provider_register(ProviderEN_ZH)
+provider_register(ProviderEN_CHT)
+provider_register(ProviderEN_DE)
+provider_register(ProviderEN_FRA)
+provider_register(ProviderEN_KOR)
+provider_register(ProviderEN_TH)
+provider_register(ProviderEN_VIE)
+
+# 翻译后端, 目前只有百度; 接入其它翻译服务后在这里注册, 即可在 DOOMN_TRANSLATE_ROUTES 中使用
+backend_register('baidu', lambda: AsyncBaiduTranslator() if const.BAIDU_ASYNC else BaiduTranslator())
+
+
+class PicTransTask(ABC):
+    """
+    payload
+    {
+        "to_lan": "jp",
+        "from_lan": "cn",
+        "image_url": "https://static-cse.canva.cn/blob/251287/YRinicGj15.bb913fe0.jpg"
+    }
+
+    return
+    {
+        "image_url": "https://static-cse.canva",
+        "json_url": "https://static-cse"
+    }
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.engine = {}
+        self.result_cache = DiskLRUCache(os.path.join(const.CACHE_DIR, 'result'), const.RESULT_CACHE_MB * 1024 * 1024)
+        # 相同图片内容和语言的并发请求合并为一次计算
+        self.in_flight = SingleFlight()
+        if const.TRANSLATE_ROUTES:
+            # 每个语言对可以配置多个翻译后端, 主后端较慢时向下一个后端发出对冲请求
+            routes = parse_routes(const.TRANSLATE_ROUTES)
+            routes.setdefault('*', ['baidu'])
+            default_translator = HedgedTranslator(create_backends(routes), routes)
+        else:
+            default_translator = AsyncBaiduTranslator() if const.BAIDU_ASYNC else BaiduTranslator()
+        self.remote_translator = default_translator
+        self.translate_batcher = None
+        if const.TRANSLATE_BATCH_WINDOW_MS > 0:
+            # 并发任务的翻译请求合并后发送
+            self.translate_batcher = BatchingTranslator(default_translator)
+            default_translator = self.translate_batcher
+        # 重复出现的文字从翻译记忆中获取, 不再请求翻译接口
+        default_translator = TranslationMemory(default_translator)
+        self.translator = default_translator
+        ocr_languages = [
+            Language.CHINESE, Language.ENGLISH, Language.Korean, Language.JAPANESE,
+            Language.CHINESE_Traditional
+        ]
+        if const.MODEL_SERVER:
+            # 模型在独立的模型服务进程中
+            from server.model_server import RemoteOcr
+            default_ocr_tool = RemoteOcr(ocr_languages)
+        else:
+            default_ocr_tool = local_ocr(ocr_languages)
+            if const.OCR_BATCH_WINDOW_MS > 0:
+                default_ocr_tool = BatchingOcr(default_ocr_tool)
+        default_ocr_tool = CachedOcr(TiledOcr(default_ocr_tool))
+        self.ocr_tool = default_ocr_tool
+        # 预加载的模型状态: pending / loading / ready / failed
+        self.models: Dict[str, str] = {}
+
+        for p_cls in PROVIDERS:
+            provider = p_cls()
+            provider.set_translator(default_translator)
+            provider.set_ocr_tool(default_ocr_tool)
+            self.engine[provider.get_key()] = provider
+
+    def start_warmup(self, ocr_lans: List[str], inpaint: bool = True) -> threading.Thread:
+        """
+        在后台线程中预加载模型并执行一次推理
+        ocr_lans: 翻译语言代码, eg: ['zh', 'en']
+        """
+        languages = [Language.from_tran(lan) for lan in ocr_lans]
+        steps = [(f"ocr:{lan.ocr}", self.ocr_tool.warmup, (lan,)) for lan in languages if lan]
+        if inpaint:
+            from server.erase import warmup
+            steps.append(("inpaint", warmup, ()))
+        for name, _, _ in steps:
+            self.models[name] = 'pending'
+
+        def run():
+            for name, fn, args in steps:
+                self.models[name] = 'loading'
+                try:
+                    fn(*args)
+                    self.models[name] = 'ready'
+                except Exception as e:
+                    self.models[name] = f'failed: {e}'
+
+        thread = threading.Thread(target=run, name="pic-trans-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def readiness(self) -> Dict:
+        return {
+            "ready": all(status == 'ready' for status in self.models.values()),
+            "models": dict(self.models),
+        }
+
+    def get_provider(self, from_lan: str, to_lan: str) -> PicTransProvider:
+        p_key = get_key(from_lan, to_lan)
+        if p_key not in self.engine:
+            raise Exception(f'do not implement translate from {from_lan} to {to_lan}')
+        return self.engine[p_key]
+
+    def prepare(self, task_ctx: Context, task_input: Dict) -> PicTransImage:
+        """
+        下载并解码图片
+        """
+        context = PContext(f"{const.UPLOADS_DIR}/{task_ctx.task_uid}", task_ctx, task_ctx.task_uid, task_input)
+
+        from_lan = task_input['from_lan']
+        to_lan = task_input['to_lan']
+        url = task_input['image_url']
+        url = unquote(url)
+
+        provider = self.get_provider(from_lan, to_lan)
+        task_ctx.labels = {"lan_pair": get_key(from_lan, to_lan), "provider": type(provider).__name__}
+        return PicTransImage(from_lan, to_lan, url, context)
+
+    @staticmethod
+    def fabric_json(fabric) -> Dict:
+        return json.loads(render_json(fabric))
+
+    def render(self, pic_trans_image: PicTransImage) -> Dict:
+        with pic_trans_image.context.stage('render'), pic_trans_image.context.timer('render'):
+            fabric_json = self.fabric_json(pic_trans_image.fabric)
+
+        # json_file_name = change_ext_to_filename(pic_trans_image.origin_image_name, '.json')
+        # json_file = os.path.join(context.resource_dir, json_file_name)
+        # with open(json_file, 'w') as jfile:
+        #     json.dump(fabric_json, jfile, indent=4)
+        #
+        # img_file_name = add_prefix_to_filename(pic_trans_image.origin_image_name, "_pic_trans")
+        # img_file = os.path.join(context.resource_dir, img_file_name)
+
+        # font = provider.box_font()
+        # fabric_img(json_file, img_file, fabric.clipPath["width"], fabric.clipPath["height"], [font.name], [font.value])
+
+        # json_file_url = context.task_context.oss_client.upload_file(json_file, json_file_name)
+        # img_file_trans = context.task_context.oss_client.upload_file(img_file, img_file_name)
+
+        return {
+            # "preview": img_file_trans,
+            "content": fabric_json,
+        }
+
+    @staticmethod
+    def cache_key(provider: PicTransProvider, pic_trans_image: PicTransImage) -> str:
+        return make_key(pic_trans_image.origin_image_hash, pic_trans_image.from_lan.trans,
+                        pic_trans_image.to_lan.trans, type(provider).__name__, provider.version)
+
+    def run(self, task_ctx: Context, task_input: Dict) -> json:
+        pic_trans_image = self.prepare(task_ctx, task_input)
+        provider = self.get_provider(task_input['from_lan'], task_input['to_lan'])
+
+        # 相同图片内容和语言的结果直接复用, 其中的图片地址都是已经上传过的
+        key = self.cache_key(provider, pic_trans_image)
+        result = self.result_cache.get(key)
+        if result is not None:
+            return result
+
+        return self.in_flight.do(key, self._trans, provider, pic_trans_image, key)
+
+    def _trans(self, provider: PicTransProvider, pic_trans_image: PicTransImage, key: str) -> Dict:
+        provider.trans(pic_trans_image)
+        result = self.render(pic_trans_image)
+        self.result_cache.put(key, result)
+        return result
+
+    def run_stream(self, task_ctx: Context, task_input: Dict, emit: Callable[[str, Dict], None]) -> Dict:
+        """
+        渐进式翻译, 依次回调
+        layout: {"content": 原图 + 文字图层的 fabric json}
+        patch: {"index": 翻译图层序号, "background": 擦除后的背景图层, "fill": 文字颜色}, 每个 box 一次
+        done: 与 run 的返回值相同
+        """
+        pic_trans_image = self.prepare(task_ctx, task_input)
+        provider = self.get_provider(task_input['from_lan'], task_input['to_lan'])
+
+        key = self.cache_key(provider, pic_trans_image)
+        result = self.result_cache.get(key)
+        if result is not None:
+            emit('done', result)
+            return result
+
+        def provider_emit(event: str, data):
+            if event == 'layout':
+                data = {"content": self.fabric_json(data)}
+            emit(event, data)
+
+        provider.trans_stream(pic_trans_image, provider_emit)
+        result = self.render(pic_trans_image)
+        self.result_cache.put(key, result)
+        emit('done', result)
+        return result
+
+    def run_batch(self, task_ctx: Context, task_input: Dict,
+                  on_result: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        批量翻译, 图片按 下载 -> ocr -> 翻译 -> 擦图 -> 合成 -> 渲染 的流水线执行,
+        不同图片的不同阶段并行, 每张图片完成后更新 task_ctx.progress['batch'] 并回调 on_result
+
+        payload
+        {
+            "to_lan": "jp",
+            "from_lan": "zh",
+            "image_urls": ["https://...", "https://..."]
+        }
+        """
+        from_lan = task_input['from_lan']
+        to_lan = task_input['to_lan']
+        urls = task_input['image_urls']
+        provider = self.get_provider(from_lan, to_lan)
+
+        batch = {"total": len(urls), "done": 0, "failed": 0, "elapsed": 0, "throughput": 0, "results": []}
+        task_ctx.set_progress('batch', batch)
+        start_time = time.time()
+
+        # 命中结果缓存的图片跳过后续阶段, task_id -> 缓存的结果
+        cached = {}
+
+        def download(value):
+            sub_ctx, url = value
+            pt = self.prepare(sub_ctx, {"from_lan": from_lan, "to_lan": to_lan, "image_url": url})
+            result = self.result_cache.get(self.cache_key(provider, pt))
+            if result is not None:
+                cached[pt.context.task_id] = result
+            return pt
+
+        def stage(name, step):
+            def run_stage(pt: PicTransImage):
+                if pt.context.task_id in cached:
+                    return pt
+                with pt.context.stage(name):
+                    step(pt)
+                return pt
+
+            return run_stage
+
+        def render(pt: PicTransImage):
+            if pt.context.task_id in cached:
+                return cached.pop(pt.context.task_id)
+            result = self.render(pt)
+            self.result_cache.put(self.cache_key(provider, pt), result)
+            return result
+
+        stages = [('download', download, 1)]
+        stages.extend((name, stage(name, step), 1) for name, step in provider.stages())
+        stages.append(('render', render, 1))
+
+        sub_ctxs = [Context(f"{task_ctx.task_uid}_{i}", task_ctx.task_type, task_ctx.oss_client) for i in range(len(urls))]
+
+        def done(item: PipelineItem):
+            result = {
+                "index": item.index,
+                "image_url": urls[item.index],
+                "progress": sub_ctxs[item.index].progress_snapshot(),
+            }
+            if item.error is None:
+                result.update(item.value)
+            else:
+                result["error"] = str(item.error)
+            # batch 在接口线程中会被序列化, 修改时持有 task_ctx.lock
+            with task_ctx.lock:
+                if item.error is not None:
+                    batch["failed"] += 1
+                batch["done"] += 1
+                batch["elapsed"] = round(time.time() - start_time, 3)
+                batch["throughput"] = round(batch["done"] / max(batch["elapsed"], 1e-6), 3)
+                batch["results"].append(result)
+            if on_result:
+                on_result(result)
+
+        run_pipeline(zip(sub_ctxs, urls), stages, done, queue_size=const.BATCH_QUEUE_SIZE)
+        return batch
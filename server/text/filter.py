@@ -1,9 +1,41 @@
 import re
-
-import pint
-
-# 创建一个UnitRegistry实例
-ureg = pint.UnitRegistry()
+from functools import lru_cache
+
+# UnitRegistry 的创建需要解析全部单位定义, 在第一次判断重量时才创建
+_ureg = None
+
+# 质量单位(小写), 对应 pint 中常用的质量单位; pint 只接受单位全称和多字母符号的复数形式(grams, lbs, 不接受 kgs)
+# micro 前缀有 u、µ(U+00B5) 和希腊字母 μ(U+03BC) 三种写法
+_MASS_PREFIXES = ['', 'y', 'z', 'a', 'f', 'p', 'n', 'u', 'µ', 'μ', 'm', 'c', 'd', 'da', 'h', 'k']
+_MASS_SYMBOLS = [f'{prefix}g' for prefix in _MASS_PREFIXES] + ['t', 'u', 'mt', 'electron_mass']
+_MASS_NAMES = [f'{prefix}gram' for prefix in ['', 'kilo', 'milli', 'micro', 'centi', 'deci', 'hecto']] + [
+    'tonne', 'metric_ton', 'ton', 'long_ton', 'short_ton', 'lb', 'pound', 'oz', 'ounce', 'gr', 'grain', 'stone',
+    'ct', 'carat', 'dr', 'dram', 'cwt', 'hundredweight', 'slug', 'amu', 'dwt', 'pennyweight', 'dalton', 'm_e']
+_MASS_PATTERN = '|'.join(sorted(_MASS_SYMBOLS + [name + 's?' for name in _MASS_NAMES], key=len, reverse=True))
+# pint 解析数字时忽略其中的逗号, eg: 1,000kg; 数字可以带乘方, eg: 5**2kg, 2^3kg
+_NUMBER_PATTERN = r'[+-]?[,.]*\d[\d,.]*(?:e[+-]?\d+)?'
+_POWER_PATTERN = r'{0}(?:(?:\*\*|\^){0})?'.format(_NUMBER_PATTERN)
+# 一项重量: 单位前的数字只能相乘(除以质量不是重量), 单位后可以乘除, eg: 2*5kg, 5kg*2, 5kg×2, 5kg/2
+# 相邻的数字之间必须有运算符, 否则一串数字有指数种切分方式, 不匹配时回溯的耗时随长度指数增长
+_MASS_TERM = r'(?:{0}[*×])*(?:{0})?(?:{1})(?:[*×/]{0})*'.format(_POWER_PATTERN, _MASS_PATTERN)
+# 多项重量相加减, eg: 5kg+2kg; 整体可以有一层括号, eg: (5kg)
+# 与 pint 的差异: 多层或局部的括号(eg: ((5kg)), 5(kg))不做处理, 按需要翻译的文字处理
+_MASS_SUM = r'{0}(?:[+-]{0})*'.format(_MASS_TERM)
+# 定义常见的长度单位
+_LENGTH_UNITS = ["mm", "cm", "m", "km", "inch", "in", "ft", "foot", "feet", "yard", "mile"]
+
+_WEIGHT_RE = re.compile(r'^(?:{0}|\({0}\)(?:[*×/]{1})*)[,.]*$'.format(_MASS_SUM, _POWER_PATTERN))
+# 有效的货币格式
+_CURRENCY_RE = re.compile(r'^(?:([£$€¥]|USD|usd|Usd|元)\s*)?[\d,.，]+\s*(?:([£$€¥]|USD|usd|Usd|元))?$')
+_LENGTH_RE = re.compile(r"^\s*([+-]?\d+(\.\d+)?)(\s*({}))\s*$".format("|".join(_LENGTH_UNITS)), re.IGNORECASE)
+
+
+def get_ureg():
+    global _ureg
+    if _ureg is None:
+        import pint
+        _ureg = pint.UnitRegistry()
+    return _ureg
 
 
 def remove_spaces(text: str) -> str:
@@ -23,12 +55,15 @@ def is_number(value: str) -> bool:
 
 
 def is_weight(text: str):
+    """
+    使用 pint 解析, 较慢, 逐个文字框判断时使用 classify
+    """
     text = remove_spaces(text)
     if len(text) == 0:
         return False
     try:
         # 尝试解析输入文本为重量单位
-        weight = ureg.Quantity(text.lower())
+        weight = get_ureg().Quantity(text.lower())
         # 检查是否是重量单位
         return weight.check('[mass]')
     except Exception:
@@ -36,39 +71,33 @@ def is_weight(text: str):
 
 
 def is_currency(text: str) -> bool:
-    value = remove_spaces(text)
-
-    # 定义正则表达式，用于匹配有效的货币格式
-    pattern = r'^(?:([£$€¥]|USD|usd|Usd|元)\s*)?[\d,.，]+\s*(?:([£$€¥]|USD|usd|Usd|元))?$'
-    # 使用正则表达式进行匹配
-    match = re.match(pattern, value)
-    if match:
-        # # 从正则表达式中提取值
-        # currency_symbol1, integer_part, decimal_part, currency_symbol2 = match.groups()
-        #
-        # # 检查整数部分
-        # if integer_part:
-        #     integer_part = integer_part.replace(',', '')
-        #     # 确保整数部分是纯数字
-        #     if not integer_part.isdigit():
-        #         return False
-        #
-        # # 如果有小数部分，则检查格式是否正确
-        # if decimal_part and not decimal_part[1:].isdigit():
-        #     return False
-
-        return True
-    else:
-        return False
+    return bool(_CURRENCY_RE.match(remove_spaces(text)))
 
 
 def is_length_unit(value: str) -> bool:
-    # 定义常见的长度单位
-    length_units = ["mm", "cm", "m", "km", "inch", "in", "ft", "foot", "feet", "yard", "mile"]
+    return bool(_LENGTH_RE.match(value.strip()))
 
-    # 正则表达式匹配模式
-    pattern = r"^\s*([+-]?\d+(\.\d+)?)(\s*({}))\s*$".format("|".join(length_units))
 
-    # 尝试匹配
-    match = re.match(pattern, value.strip(), re.IGNORECASE)
-    return bool(match)
\ No newline at end of file
+@lru_cache(maxsize=4096)
+def classify(text: str) -> str:
+    """
+    不需要翻译的文字类型: number / weight / currency / length, 需要翻译时返回空字符串
+    重量用预编译的单位正则代替 pint 解析, 与 is_weight 的对照和耗时见 server/bench/text_filter.py
+    """
+    value = remove_spaces(text)
+    if is_number(value):
+        return 'number'
+    if value and _WEIGHT_RE.match(value.lower()):
+        return 'weight'
+    if _CURRENCY_RE.match(value):
+        return 'currency'
+    if _LENGTH_RE.match(text.strip()):
+        return 'length'
+    return ''
+
+
+def is_non_translatable(text: str) -> bool:
+    """
+    数字、重量、货币不翻译, 与 is_number or is_weight or is_currency 一致
+    """
+    return classify(text) in ('number', 'weight', 'currency')
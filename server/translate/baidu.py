@@ -1,21 +1,41 @@
+import asyncio
 import hashlib
 import random
 import re
+import threading
+import time
 import urllib.parse
 
-import aiohttp
 import requests
 
+from server import const
 from server.base import Language
+from server.common.limits import CircuitBreaker, TokenBucket, backoff
 from server.translate.base import Translate
 
 BAIDU_APP_ID = 'xxx'
 BAIDU_SECRET_KEY = 'xxx'
 
-# base api url
-BASE_URL = 'api.fanyi.baidu.com'
+# base api url, 可以指向本地的模拟服务(server/translate/stub.py)
+BASE_URL = const.BAIDU_URL
 API_URL = '/api/trans/vip/translate'
 
+# 可以重试的错误码: 访问频率受限、请求超时、系统错误、长query请求频繁
+RETRYABLE_CODES = {'54003', '52001', '52002', '54005'}
+# 其中访问频率受限的错误只重试, 不计入熔断
+THROTTLED_CODES = {'54003', '54005', 'http_429'}
+
+
+class BaiduError(Exception):
+    """
+    百度翻译返回的错误, code 为百度的错误码, 网络错误为 network, HTTP 错误为 http_{status}
+    """
+
+    def __init__(self, code: str, message: str, retryable: bool = None):
+        super().__init__(f'Baidu returned error {code}: {message}')
+        self.code = code
+        self.retryable = code in RETRYABLE_CODES if retryable is None else retryable
+
 
 class BaiduTranslator(Translate):
     _LANGUAGE_CODE_MAP = {
@@ -42,16 +62,81 @@ class BaiduTranslator(Translate):
     }
     _INVALID_REPEAT_COUNT = 1
 
-    def __init__(self) -> None:
+    def __init__(self, qps: float = const.BAIDU_QPS, retries: int = const.BAIDU_RETRIES,
+                 limiter: TokenBucket = None, breaker: CircuitBreaker = None) -> None:
         super().__init__()
         if not BAIDU_APP_ID or not BAIDU_SECRET_KEY:
             raise Exception(
                 'Please set the BAIDU_APP_ID and BAIDU_SECRET_KEY environment variables before using the baidu translator.')
+        # 按账号的 QPS 限流, 遇到可重试的错误时退避重试, 连续失败时熔断
+        # 使用同一个账号的多个实例需要传入同一个 limiter 和 breaker, 否则合计的 QPS 会超过账号的上限
+        self.limiter = limiter or TokenBucket(qps, const.BAIDU_BURST)
+        self.breaker = breaker or CircuitBreaker('baidu translate', const.BAIDU_BREAKER_FAILURES,
+                                                 const.BAIDU_BREAKER_RESET)
+        self.retries = retries
+        self.retried = 0
 
     def translate(self, from_lang: Language, to_lang: Language, queries):
         if len(queries) == 0:
             return []
 
+        n_queries, query_split_sizes = self.split_queries(queries)
+        return self.join_results(self.request(from_lang.trans, to_lang.trans, n_queries), query_split_sizes)
+
+    def request(self, from_lang: str, to_lang: str, lines) -> list:
+        for attempt in range(self.retries + 1):
+            probe = self.breaker.check()
+            try:
+                self.limiter.acquire()
+                result = self.parse_result(self.send(from_lang, to_lang, '\n'.join(lines)))
+            except BaiduError as e:
+                if not self.on_error(e, attempt, probe):
+                    raise
+            except Exception:
+                # 响应无法解析等错误同样计入熔断
+                self.breaker.failure()
+                raise
+            else:
+                self.breaker.success()
+                return result
+            finally:
+                self.breaker.release(probe)
+            time.sleep(backoff(attempt, const.BAIDU_RETRY_BASE))
+
+    def send(self, from_lang: str, to_lang: str, query_text: str) -> dict:
+        url = self.get_url(from_lang, to_lang, query_text)
+        try:
+            response = requests.get(BASE_URL + url, timeout=30)
+        except requests.RequestException as e:
+            raise BaiduError('network', str(e), retryable=True)
+
+        if response.status_code != 200:
+            raise BaiduError(f'http_{response.status_code}', response.reason,
+                             retryable=response.status_code >= 500 or response.status_code == 429)
+        return response.json()
+
+    def on_error(self, e: BaiduError, attempt: int, probe: int = 0) -> bool:
+        """
+        记录失败, 返回是否重试
+        """
+        if not e.retryable:
+            # 接口有正常响应, 不计入熔断
+            self.breaker.success()
+            return False
+        if e.code not in THROTTLED_CODES or probe:
+            # 试探调用被限流时无法确认接口已恢复, 同样继续熔断
+            self.breaker.failure()
+        if attempt >= self.retries or self.breaker.state == 'open':
+            # 这次失败触发了熔断, 不再等待重试
+            return False
+        self.retried += 1
+        return True
+
+    def stats(self):
+        return {"breaker": self.breaker.stats(), "retried": self.retried}
+
+    @staticmethod
+    def split_queries(queries):
         # Split queries with \n up
         n_queries = []
         query_split_sizes = []
@@ -59,24 +144,23 @@ class BaiduTranslator(Translate):
             batch = query.split('\n')
             query_split_sizes.append(len(batch))
             n_queries.extend(batch)
+        return n_queries, query_split_sizes
 
-        url = self.get_url(from_lang.trans, to_lang.trans, '\n'.join(n_queries))
-        response = requests.get('https://' + BASE_URL + url)
-
-        if response.status_code == 200:
-            result = response.json()
-        else:
-            raise Exception(
-                f'Baidu returned invalid status code: {response.status_code} and message: {response.reason} \n Are the API keys set correctly?')
-
+    @staticmethod
+    def parse_result(result) -> list:
         result_list = []
+        if result.get("error_code", "52000") != "52000":
+            raise BaiduError(str(result["error_code"]), result.get("error_msg", ""))
         if "trans_result" not in result:
             raise Exception(f'Baidu returned invalid response: {result}\nAre the API keys set correctly?')
 
         for ret in result["trans_result"]:
             for v in ret["dst"].split('\n'):
                 result_list.append(v)
+        return result_list
 
+    @staticmethod
+    def join_results(result_list, query_split_sizes):
         # Join queries that had \n back together
         translations = []
         i = 0
@@ -91,7 +175,7 @@ class BaiduTranslator(Translate):
         return query
 
     @staticmethod
-    def get_url(from_lang, to_lang, query_text):
+    def get_params(from_lang, to_lang, query_text):
         # 随机数据
         salt = random.randint(32768, 65536)
         # MD5生成签名
@@ -99,7 +183,110 @@ class BaiduTranslator(Translate):
         m1 = hashlib.md5()
         m1.update(sign.encode('utf-8'))
         sign = m1.hexdigest()
+        return {'appid': BAIDU_APP_ID, 'q': query_text, 'from': from_lang, 'to': to_lang, 'salt': str(salt),
+                'sign': sign}
+
+    @staticmethod
+    def get_url(from_lang, to_lang, query_text):
+        params = BaiduTranslator.get_params(from_lang, to_lang, query_text)
         # 拼接URL
-        url = API_URL + '?appid=' + BAIDU_APP_ID + '&q=' + urllib.parse.quote(
-            query_text) + '&from=' + from_lang + '&to=' + to_lang + '&salt=' + str(salt) + '&sign=' + sign
-        return url
+        return API_URL + '?' + urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
+
+
+def chunk_lines(lines, max_bytes: int):
+    """
+    按行切分, 每块拼接后的 utf-8 长度不超过 max_bytes(单行超长时单独成块)
+    """
+    chunks, chunk, size = [], [], 0
+    for line in lines:
+        line_size = len(line.encode('utf-8')) + 1
+        if chunk and size + line_size > max_bytes:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += line_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class AsyncBaiduTranslator(BaiduTranslator):
+    """
+    异步的百度翻译
+    复用连接池中的连接(省去每次请求的 TLS 握手), 使用 POST 提交, 不受 URL 长度限制;
+    文字较多时按 chunk_bytes 切分成多个请求并发发送, 按原顺序合并结果。
+    请求在独立线程的事件循环中执行, translate 可以在任意线程中调用, 协程中使用 atranslate
+    """
+
+    def __init__(self, chunk_bytes: int = const.BAIDU_CHUNK_BYTES, concurrency: int = const.BAIDU_CONCURRENCY,
+                 qps: float = const.BAIDU_QPS, retries: int = const.BAIDU_RETRIES,
+                 limiter: TokenBucket = None, breaker: CircuitBreaker = None) -> None:
+        super().__init__(qps, retries, limiter, breaker)
+        self.chunk_bytes = chunk_bytes
+        self.concurrency = max(concurrency, 1)
+        self.session = None
+        self.semaphore = None
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="baidu-translate", daemon=True).start()
+
+    def translate(self, from_lang: Language, to_lang: Language, queries):
+        return asyncio.run_coroutine_threadsafe(self.atranslate(from_lang, to_lang, queries), self.loop).result()
+
+    def close(self):
+        async def close_session():
+            if self.session is not None:
+                await self.session.close()
+                self.session = None
+
+        asyncio.run_coroutine_threadsafe(close_session(), self.loop).result()
+
+    async def atranslate(self, from_lang: Language, to_lang: Language, queries):
+        if len(queries) == 0:
+            return []
+
+        n_queries, query_split_sizes = self.split_queries(queries)
+        chunks = chunk_lines(n_queries, self.chunk_bytes)
+        results = await asyncio.gather(*[self.request(from_lang.trans, to_lang.trans, chunk) for chunk in chunks])
+        return self.join_results([line for result in results for line in result], query_split_sizes)
+
+    async def request(self, from_lang: str, to_lang: str, lines) -> list:
+        for attempt in range(self.retries + 1):
+            probe = self.breaker.check()
+            try:
+                wait = self.limiter.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                result = self.parse_result(await self.send(from_lang, to_lang, '\n'.join(lines)))
+            except BaiduError as e:
+                if not self.on_error(e, attempt, probe):
+                    raise
+            except Exception:
+                self.breaker.failure()
+                raise
+            else:
+                self.breaker.success()
+                return result
+            finally:
+                # 被取消时(CancelledError)也让出试探机会
+                self.breaker.release(probe)
+            await asyncio.sleep(backoff(attempt, const.BAIDU_RETRY_BASE))
+
+    async def send(self, from_lang: str, to_lang: str, query_text: str) -> dict:
+        import aiohttp
+        if self.session is None:
+            # 在事件循环线程中创建
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=30))
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self.semaphore:
+            data = self.get_params(from_lang, to_lang, query_text)
+            try:
+                async with self.session.post(BASE_URL + API_URL, data=data) as response:
+                    if response.status != 200:
+                        raise BaiduError(f'http_{response.status}', response.reason,
+                                         retryable=response.status >= 500 or response.status == 429)
+                    return await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise BaiduError('network', str(e), retryable=True)
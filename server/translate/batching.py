@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from server import const
+from server.base import Language
+from server.translate.base import Translate
+
+
+class _Batch:
+    def __init__(self, from_lang: Language, to_lang: Language, deadline: float):
+        self.from_lang = from_lang
+        self.to_lang = to_lang
+        self.deadline = deadline
+        self.queries: List[str] = []
+        self.future = Future()
+
+
+class BatchingTranslator(Translate):
+    """
+    合并并发任务的翻译请求
+    同一语言对的文字在 window_ms 毫秒内(或凑够 max_queries 条)合并为一次上游请求, 相同的文字只翻译一次,
+    每个调用方取回自己那一段结果。上游请求出错时, 这一批的调用方都收到同一个异常
+    """
+
+    def __init__(self, translator: Translate, window_ms: int = const.TRANSLATE_BATCH_WINDOW_MS,
+                 max_queries: int = const.TRANSLATE_BATCH_SIZE, workers: int = const.TRANSLATE_BATCH_WORKERS):
+        super().__init__()
+        self.translator = translator
+        self.window = window_ms / 1000
+        self.max_queries = max(max_queries, 1)
+        self.executor = ThreadPoolExecutor(max(workers, 1), thread_name_prefix="translate-batch")
+        # 正在收集的批次, 每个语言对最多一个
+        self.batches: Dict[Tuple[str, str], _Batch] = {}
+        self.cond = threading.Condition()
+        self.sent = 0
+        self.queries = 0
+        self.upstream_queries = 0
+        threading.Thread(target=self._work, name="translate-batching", daemon=True).start()
+
+    def translate(self, from_lang: Language, to_lang: Language, queries):
+        if len(queries) == 0:
+            return []
+
+        key = (from_lang.trans, to_lang.trans)
+        with self.cond:
+            batch = self.batches.get(key)
+            if batch is None:
+                batch = _Batch(from_lang, to_lang, time.monotonic() + self.window)
+                self.batches[key] = batch
+                self.cond.notify()
+            offset = len(batch.queries)
+            batch.queries.extend(queries)
+            if len(batch.queries) >= self.max_queries:
+                # 已凑满, 不再等待
+                del self.batches[key]
+                self.executor.submit(self._send, batch)
+
+        return batch.future.result()[offset:offset + len(queries)]
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.batches:
+                    self.cond.wait()
+                now = time.monotonic()
+                expired = [key for key, batch in self.batches.items() if batch.deadline <= now]
+                if not expired:
+                    self.cond.wait(min(batch.deadline for batch in self.batches.values()) - now)
+                    continue
+                for key in expired:
+                    self.executor.submit(self._send, self.batches.pop(key))
+
+    def _send(self, batch: _Batch):
+        unique = list(dict.fromkeys(batch.queries))
+        try:
+            results = self.translator.translate(batch.from_lang, batch.to_lang, unique)
+            if len(results) != len(unique):
+                raise Exception(f"translator returned {len(results)} results for {len(unique)} queries")
+        except Exception as e:
+            batch.future.set_exception(e)
+            return
+
+        translated = dict(zip(unique, results))
+        batch.future.set_result([translated[query] for query in batch.queries])
+        with self.cond:
+            self.sent += 1
+            self.queries += len(batch.queries)
+            self.upstream_queries += len(unique)
+
+    def stats(self) -> Dict:
+        with self.cond:
+            return {
+                "batches": self.sent,
+                "queries": self.queries,
+                "upstream_queries": self.upstream_queries,
+                "avg_batch": round(self.queries / self.sent, 2) if self.sent else 0,
+            }
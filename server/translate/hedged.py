@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from server import const
+from server.base import Language
+from server.translate.base import Translate
+
+
+# 可以在路由中使用的翻译后端: 名称 -> 创建函数
+# 每个后端应是独立的翻译服务(或独立的账号), 有各自的限流和熔断, 同一个账号的两个客户端对冲没有意义
+BACKENDS: Dict[str, Callable[[], Translate]] = {}
+
+
+def backend_register(name: str, factory: Callable[[], Translate]):
+    BACKENDS[name] = factory
+
+
+def create_backends(routes: Dict[str, List[str]], created: Dict[str, Translate] = None) -> Dict[str, Translate]:
+    """
+    创建路由中用到的翻译后端, 每个名称只创建一次; created 为已经创建好的后端
+    """
+    backends = dict(created or {})
+    for names in routes.values():
+        for name in names:
+            if name in backends:
+                continue
+            if name not in BACKENDS:
+                raise Exception(f"unknown translate backend: {name}, registered: {sorted(BACKENDS)}")
+            backends[name] = BACKENDS[name]()
+    return backends
+
+
+def parse_routes(text: str) -> Dict[str, List[str]]:
+    """
+    解析各语言对使用的翻译后端, eg: "zh-en:baidu,backup;*:baidu" -> {"zh-en": ["baidu", "backup"], "*": ["baidu"]}
+    第一个为主后端, 其余依次作为对冲请求的后端, * 为默认; 后端的名称由 backend_register 注册
+    """
+    routes = {}
+    for item in text.split(';'):
+        if not item.strip():
+            continue
+        pair, names = item.split(':', 1)
+        routes[pair.strip()] = [name.strip() for name in names.split(',') if name.strip()]
+    return routes
+
+
+class LatencyStats:
+    """
+    最近 window 次请求的耗时
+    """
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float, ok: bool):
+        with self.lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append(seconds)
+            else:
+                self.errors += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self.lock:
+            if not self.latencies:
+                return None
+            values = sorted(self.latencies)
+        return values[min(int(len(values) * q), len(values) - 1)]
+
+    def stats(self) -> Dict:
+        p50, p90 = self.quantile(0.5), self.quantile(0.9)
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "wins": self.wins,
+                "p50_ms": round(p50 * 1000) if p50 is not None else None,
+                "p90_ms": round(p90 * 1000) if p90 is not None else None,
+            }
+
+
+class HedgedTranslator(Translate):
+    """
+    对冲请求
+    每个语言对配置多个翻译后端, 先请求主后端, 超过主后端最近的 p90 耗时仍未返回(或已经出错)时,
+    再请求下一个后端, 最先返回有效结果的后端胜出, 其余请求的结果丢弃(耗时仍计入统计)。
+    样本不足 min_samples 时使用 default_delay_ms 作为对冲的等待时间
+    """
+
+    def __init__(self, backends: Dict[str, Translate], routes: Dict[str, List[str]],
+                 default_delay_ms: int = const.TRANSLATE_HEDGE_DEFAULT_MS,
+                 min_samples: int = const.TRANSLATE_HEDGE_MIN_SAMPLES):
+        super().__init__()
+        for pair, names in routes.items():
+            unknown = [name for name in names if name not in backends]
+            if not names or unknown:
+                raise Exception(f"invalid translate route {pair}: {names}")
+        self.backends = backends
+        self.routes = routes
+        self.default_delay = default_delay_ms / 1000
+        self.min_samples = min_samples
+        self.latency = {name: LatencyStats() for name in backends}
+        self.hedges = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(const.TRANSLATE_HEDGE_WORKERS, thread_name_prefix='translate-hedge')
+
+    def route(self, from_lang: Language, to_lang: Language) -> List[str]:
+        return self.routes.get(f"{from_lang.trans}-{to_lang.trans}") or self.routes['*']
+
+    def hedge_delay(self, name: str) -> float:
+        stats = self.latency[name]
+        if len(stats.latencies) < self.min_samples:
+            return self.default_delay
+        return stats.quantile(0.9)
+
+    def call(self, name: str, from_lang: Language, to_lang: Language, queries):
+        start = time.perf_counter()
+        try:
+            result = self.backends[name].translate(from_lang, to_lang, queries)
+            if len(result) != len(queries):
+                raise Exception(f"{name} returned {len(result)} results for {len(queries)} queries")
+        except Exception:
+            self.latency[name].observe(time.perf_counter() - start, False)
+            raise
+        self.latency[name].observe(time.perf_counter() - start, True)
+        return result
+
+    def translate(self, from_lang: Language, to_lang: Language, queries):
+        if len(queries) == 0:
+            return []
+
+        names = self.route(from_lang, to_lang)
+        running = {}
+        error = None
+        for i, name in enumerate(names):
+            running[self.executor.submit(self.call, name, from_lang, to_lang, queries)] = name
+            if i > 0:
+                with self.lock:
+                    self.hedges += 1
+            last = i == len(names) - 1
+            # 等待当前后端的 p90, 期间任一请求成功即返回; 最后一个后端发出后一直等到全部结束
+            deadline = None if last else time.monotonic() + self.hedge_delay(name)
+            while running:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                done, _ = futures.wait(running, timeout=timeout, return_when=futures.FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    winner = running.pop(future)
+                    if future.exception() is None:
+                        with self.latency[winner].lock:
+                            self.latency[winner].wins += 1
+                        return future.result()
+                    error = future.exception()
+                if not running:
+                    # 已发出的请求都失败了, 立即请求下一个后端
+                    break
+        raise error
+
+    def stats(self) -> Dict:
+        return {
+            "hedges": self.hedges,
+            "backends": {name: stats.stats() for name, stats in self.latency.items()},
+        }
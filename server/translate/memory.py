@@ -0,0 +1,144 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List
+
+from server import const
+from server.base import Language
+from server.translate.base import Translate
+
+
+def normalize(text: str) -> str:
+    """
+    全角转半角、合并连续空白, 作为翻译记忆的 key
+    """
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+class TranslationMemory(Translate):
+    """
+    SQLite 翻译记忆, 包装任意 Translate
+    以 (源语言, 目标语言, 归一化后的文本) 为 key, 批量查询全部文本, 只把未命中的文本发给被包装的翻译,
+    翻译结果写回数据库。超过 ttl 秒的记录视为过期, 条目数超过 max_entries 时淘汰最久未使用的记录
+    """
+    # sqlite 单条语句的参数个数有上限
+    _CHUNK = 500
+
+    def __init__(self, translator: Translate, path: str = const.TRANSLATION_MEMORY_DB,
+                 max_entries: int = const.TRANSLATION_MEMORY_ENTRIES, ttl: int = const.TRANSLATION_MEMORY_TTL):
+        super().__init__()
+        self.translator = translator
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.conn() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS memory ('
+                         'from_lan TEXT NOT NULL, to_lan TEXT NOT NULL, text TEXT NOT NULL, translation TEXT NOT NULL, '
+                         'created_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (from_lan, to_lan, text))')
+            conn.execute('CREATE INDEX IF NOT EXISTS memory_accessed ON memory (accessed_at)')
+
+    def conn(self) -> sqlite3.Connection:
+        # 每个线程使用独立的连接
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self.local.conn = conn
+        return conn
+
+    def lookup(self, from_lan: str, to_lan: str, texts: List[str]) -> Dict[str, str]:
+        found = {}
+        now = time.time()
+        conn = self.conn()
+        for i in range(0, len(texts), self._CHUNK):
+            chunk = texts[i:i + self._CHUNK]
+            rows = conn.execute(
+                f"SELECT text, translation FROM memory WHERE from_lan = ? AND to_lan = ? AND created_at >= ? "
+                f"AND text IN ({','.join('?' * len(chunk))})",
+                [from_lan, to_lan, now - self.ttl if self.ttl > 0 else 0] + chunk).fetchall()
+            found.update(rows)
+        if found:
+            with conn:
+                conn.executemany('UPDATE memory SET accessed_at = ? WHERE from_lan = ? AND to_lan = ? AND text = ?',
+                                 [(now, from_lan, to_lan, text) for text in found])
+        return found
+
+    def store(self, from_lan: str, to_lan: str, translations: Dict[str, str]):
+        now = time.time()
+        conn = self.conn()
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?, ?, ?)',
+                             [(from_lan, to_lan, text, dst, now, now) for text, dst in translations.items()])
+        with self.lock:
+            self.writes += len(translations)
+            # 每写入一批检查一次是否需要淘汰
+            evict = self.writes >= max(self.max_entries // 10, 1)
+            if evict:
+                self.writes = 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        conn = self.conn()
+        with conn:
+            removed = 0
+            if self.ttl > 0:
+                removed += conn.execute('DELETE FROM memory WHERE created_at < ?', (time.time() - self.ttl,)).rowcount
+            if self.max_entries > 0:
+                count = conn.execute('SELECT COUNT(*) FROM memory').fetchone()[0]
+                if count > self.max_entries:
+                    removed += conn.execute(
+                        'DELETE FROM memory WHERE rowid IN (SELECT rowid FROM memory ORDER BY accessed_at LIMIT ?)',
+                        (count - self.max_entries,)).rowcount
+        with self.lock:
+            self.evictions += removed
+
+    def translate(self, from_lang: Language, to_lang: Language, queries):
+        if len(queries) == 0:
+            return []
+
+        keys = [normalize(query) for query in queries]
+        # 归一化的文本只作为 key, 上游仍然翻译原文(保留全角字符和换行), 同一个 key 取第一次出现的原文
+        originals = {}
+        for key, query in zip(keys, queries):
+            if key:
+                originals.setdefault(key, query)
+        texts = list(originals)
+        found = self.lookup(from_lang.trans, to_lang.trans, texts)
+        missed = [text for text in texts if text not in found]
+        with self.lock:
+            self.hits += len(texts) - len(missed)
+            self.misses += len(missed)
+
+        if missed:
+            results = self.translator.translate(from_lang, to_lang, [originals[text] for text in missed])
+            if len(results) != len(missed):
+                raise Exception(f"translator returned {len(results)} results for {len(missed)} queries")
+            translated = dict(zip(missed, results))
+            self.store(from_lang.trans, to_lang.trans, translated)
+            found.update(translated)
+        return [found[key] if key else query for key, query in zip(keys, queries)]
+
+    def stats(self) -> Dict:
+        count = self.conn().execute('SELECT COUNT(*) FROM memory').fetchone()[0]
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": count,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0,
+            }
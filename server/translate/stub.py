@@ -0,0 +1,125 @@
+"""
+本地模拟的百度翻译接口, 用于离线测试限流、重试、熔断以及压测
+
+启动: python -m server.translate.stub --port 8600 --qps 10 --error-rate 0.1 --latency 50
+翻译服务设置环境变量 DOOMN_BAIDU_URL=http://127.0.0.1:8600 后使用模拟接口
+译文为 "[目标语言]原文"
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_URL = '/api/trans/vip/translate'
+
+
+class StubState:
+    """
+    模拟的接口行为: 每秒最多 qps 个请求(超出返回 54003), 按 error_rate 随机返回 52001,
+    down 为 True 时全部返回 52002, 每个请求延迟 latency 毫秒
+    """
+
+    def __init__(self, qps: float = 0, error_rate: float = 0, latency: float = 0, down: bool = False):
+        self.qps = qps
+        self.error_rate = error_rate
+        self.latency = latency
+        self.down = down
+        self.window = 0
+        self.window_count = 0
+        self.requests = 0
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def error(self):
+        with self.lock:
+            self.requests += 1
+            now = int(time.time())
+            if now != self.window:
+                self.window, self.window_count = now, 0
+            self.window_count += 1
+            if self.down:
+                code = '52002'
+            elif 0 < self.qps < self.window_count:
+                code = '54003'
+            elif random.random() < self.error_rate:
+                code = '52001'
+            else:
+                return None
+            self.errors[code] = self.errors.get(code, 0) + 1
+            return code
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.respond(parse_qs(urlparse(self.path).query))
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+            self.respond(parse_qs(body, keep_blank_values=True))
+
+        def respond(self, params):
+            if urlparse(self.path).path != API_URL:
+                self.send_error(404)
+                return
+            if state.latency > 0:
+                time.sleep(state.latency / 1000)
+
+            code = state.error()
+            if code:
+                result = {'error_code': code, 'error_msg': 'stub error'}
+            else:
+                to_lan = params.get('to', [''])[0]
+                lines = params.get('q', [''])[0].split('\n')
+                result = {'from': params.get('from', [''])[0], 'to': to_lan,
+                          'trans_result': [{'src': line, 'dst': f'[{to_lan}]{line}'} for line in lines]}
+
+            data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str, port: int, state: StubState) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动模拟服务, port 为 0 时随机分配端口(server.server_address[1])
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="baidu-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="baidu translate stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--qps", type=float, default=0, help="每秒最多处理的请求数, 0 表示不限制")
+    parser.add_argument("--error-rate", type=float, default=0, help="随机返回 52001 的比例")
+    parser.add_argument("--latency", type=float, default=0, help="每个请求的延迟(毫秒)")
+    parser.add_argument("--down", action="store_true", help="全部返回 52002")
+    args = parser.parse_args()
+
+    state = StubState(args.qps, args.error_rate, args.latency, args.down)
+    server = serve(args.host, args.port, state)
+    print(f"baidu stub listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"requests: {state.requests}, errors: {state.errors}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from server.base import PicTransOcrBox
+from server.ocr.base import OCR
+from server.translate.base import Translate
+
+
+class FakeTranslator(Translate):
+    """
+    译文为 "{prefix}原文", 记录每次调用的文字
+    """
+
+    def __init__(self, prefix: str = '>', delay: float = 0, error: Exception = None):
+        super().__init__()
+        self.prefix = prefix
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def translate(self, from_lang, to_lang, queries):
+        with self.lock:
+            self.calls.append(list(queries))
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [f"{self.prefix}{query}" for query in queries]
+
+
+class FakeOcr(OCR):
+    """
+    每张图片返回一个文字框, 文字为图片的尺寸, 记录每次调用的图片数
+    """
+
+    def __init__(self, languages=None, version: int = 1):
+        super().__init__(languages)
+        self.version = version
+        self.calls = []
+
+    def cache_id(self) -> str:
+        return f"{super().cache_id()}:{self.version}"
+
+    def ocr(self, image, lan, threshold=0.8):
+        return self.ocr_batch([image], lan, threshold)[0]
+
+    def ocr_batch(self, images, lan, threshold=0.8):
+        self.calls.append(len(images))
+        results = []
+        for image in images:
+            box = PicTransOcrBox(lan)
+            box.ocr_box = [[10, 10], [50, 10], [50, 30], [10, 30]]
+            box.text = f"{image.shape[1]}x{image.shape[0]}"
+            results.append([box])
+        return results
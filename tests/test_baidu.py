@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+
+from server.base import Language
+from server.common.limits import CircuitBreaker, CircuitOpen
+from server.translate import baidu
+from server.translate.baidu import AsyncBaiduTranslator, BaiduError, BaiduTranslator, chunk_lines
+from server.translate.stub import StubState, serve
+
+RESET = 0.2
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    state = StubState()
+    server = serve('127.0.0.1', 0, state)
+    monkeypatch.setattr(baidu, 'BASE_URL', f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(baidu.const, 'BAIDU_RETRY_BASE', 0.01)
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def make_translator(cls, retries=0):
+    translator = cls(qps=0, retries=retries)
+    translator.breaker = CircuitBreaker('baidu translate', failures=2, reset_timeout=RESET)
+    return translator
+
+
+def translate(translator):
+    return translator.translate(Language.CHINESE, Language.ENGLISH, ['你好', '第一行\n第二行'])
+
+
+@pytest.fixture(params=[BaiduTranslator, AsyncBaiduTranslator])
+def translator(request):
+    translator = make_translator(request.param)
+    yield translator
+    if isinstance(translator, AsyncBaiduTranslator):
+        translator.close()
+
+
+def test_translate(stub, translator):
+    assert translate(translator) == ['[en]你好', '[en]第一行\n[en]第二行']
+
+
+def test_breaker_recovers_after_throttled_probe(stub, translator):
+    stub.down = True
+    for _ in range(2):
+        with pytest.raises(BaiduError):
+            translate(translator)
+    assert translator.breaker.state == 'open'
+    requests = stub.requests
+    with pytest.raises(CircuitOpen):
+        translate(translator)
+    assert stub.requests == requests
+
+    # 接口恢复了, 但试探调用被限流: 继续熔断
+    stub.down = False
+    stub.qps = 0.5
+    time.sleep(RESET)
+    with pytest.raises(BaiduError) as e:
+        translate(translator)
+    assert e.value.code == '54003'
+    assert translator.breaker.state == 'open'
+
+    stub.qps = 0
+    time.sleep(RESET)
+    assert translate(translator) == ['[en]你好', '[en]第一行\n[en]第二行']
+    assert translator.breaker.state == 'closed'
+
+
+def test_breaker_recovers_after_invalid_probe(stub, translator, monkeypatch):
+    stub.down = True
+    for _ in range(2):
+        with pytest.raises(BaiduError):
+            translate(translator)
+
+    # 试探调用的响应无法解析
+    stub.down = False
+    parse_result = translator.parse_result
+    monkeypatch.setattr(translator, 'parse_result', lambda result: parse_result({}))
+    time.sleep(RESET)
+    with pytest.raises(Exception, match='invalid response'):
+        translate(translator)
+    assert translator.breaker.state == 'open'
+
+    monkeypatch.setattr(translator, 'parse_result', parse_result)
+    time.sleep(RESET)
+    assert translate(translator)[0] == '[en]你好'
+    assert translator.breaker.state == 'closed'
+
+
+def test_cancelled_probe_is_released(stub):
+    translator = make_translator(AsyncBaiduTranslator)
+    try:
+        stub.down = True
+        for _ in range(2):
+            with pytest.raises(BaiduError):
+                translate(translator)
+
+        stub.down = False
+        stub.latency = 500
+        time.sleep(RESET)
+
+        async def cancel():
+            task = asyncio.ensure_future(translator.request('zh', 'en', ['你好']))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run_coroutine_threadsafe(cancel(), translator.loop).result()
+        assert translator.breaker.state == 'half_open'
+        stub.latency = 0
+        assert translate(translator)[0] == '[en]你好'
+        assert translator.breaker.state == 'closed'
+    finally:
+        translator.close()
+
+
+def test_retry_then_success(stub):
+    translator = make_translator(BaiduTranslator, retries=3)
+    stub.qps = 0.5
+    with pytest.raises(BaiduError):
+        translate(translator)
+    # 限流不计入熔断
+    assert translator.breaker.state == 'closed'
+    assert translator.retried == 3
+
+    stub.qps = 0
+    assert translate(translator)[0] == '[en]你好'
+
+
+def test_no_retry_after_breaker_opens(stub):
+    translator = make_translator(BaiduTranslator, retries=5)
+    stub.down = True
+    with pytest.raises(BaiduError):
+        translate(translator)
+    # 第 2 次失败触发熔断后不再重试
+    assert stub.requests == 2
+    assert translator.retried == 1
+
+
+def test_chunk_lines():
+    assert chunk_lines(['a', 'bb', 'ccc'], 5) == [['a', 'bb'], ['ccc']]
+    assert chunk_lines(['x' * 10, 'y'], 5) == [['x' * 10], ['y']]
+    assert chunk_lines([], 5) == []
@@ -0,0 +1,52 @@
+import os
+
+from server.common.cache import DiskLRUCache, make_key
+
+
+def test_make_key():
+    assert make_key('a', 1) == make_key('a', 1)
+    # 各部分之间有分隔符, 不会因为拼接而相同
+    assert make_key('ab', 'c') != make_key('a', 'bc')
+
+
+def test_disk_get_put(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 1024)
+    assert cache.get('a') is None
+    cache.put('a', {"image_url": "x"})
+    assert cache.get('a') == {"image_url": "x"}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_disk_evict_least_recently_used(tmp_path):
+    # 每个条目 json 序列化后 12 字节
+    cache = DiskLRUCache(str(tmp_path), 36)
+    for key in 'abc':
+        cache.put(key, {"v": key * 3})
+    cache.get('a')
+    cache.put('d', {"v": 'ddd'})
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in 'acd')
+    assert not os.path.exists(os.path.join(tmp_path, 'b.json'))
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_skip_oversized(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 8)
+    cache.put('a', {"v": 'x' * 100})
+    assert cache.get('a') is None
+
+
+def test_disk_restore_after_restart(tmp_path):
+    DiskLRUCache(str(tmp_path), 1024).put('a', [1, 2])
+    cache = DiskLRUCache(str(tmp_path), 1024)
+    assert cache.get('a') == [1, 2]
+    assert cache.stats()['size'] == len('[1, 2]')
+
+
+def test_disk_file_removed(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 1024)
+    cache.put('a', 1)
+    os.remove(os.path.join(tmp_path, 'a.json'))
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from server.base import Language
+from server.translate import hedged as hedged_module
+from server.translate.hedged import HedgedTranslator, backend_register, create_backends, parse_routes
+from tests.fakes import FakeTranslator
+
+ZH, EN, JP = Language.CHINESE, Language.ENGLISH, Language.JAPANESE
+
+
+def hedged(backends, routes='*:primary,backup', delay_ms=50):
+    return HedgedTranslator(backends, parse_routes(routes), default_delay_ms=delay_ms, min_samples=5)
+
+
+def test_parse_routes():
+    assert parse_routes('zh-en:baidu, backup ;*:baidu;') == {'zh-en': ['baidu', 'backup'], '*': ['baidu']}
+
+
+def test_unknown_backend():
+    with pytest.raises(Exception, match='invalid translate route'):
+        hedged({'primary': FakeTranslator()}, '*:primary,missing')
+
+
+def test_fast_primary_no_hedge():
+    primary, backup = FakeTranslator('p:'), FakeTranslator('b:')
+    translator = hedged({'primary': primary, 'backup': backup})
+    assert translator.translate(ZH, EN, ['a', 'b']) == ['p:a', 'p:b']
+    assert backup.calls == []
+    assert translator.stats()['hedges'] == 0
+
+
+def test_slow_primary_hedged():
+    primary, backup = FakeTranslator('p:', delay=0.5), FakeTranslator('b:')
+    translator = hedged({'primary': primary, 'backup': backup})
+    start = time.monotonic()
+    assert translator.translate(ZH, EN, ['a']) == ['b:a']
+    assert time.monotonic() - start < 0.3
+    stats = translator.stats()
+    assert stats['hedges'] == 1
+    assert stats['backends']['backup']['wins'] == 1
+
+
+def test_failed_primary_falls_back_immediately():
+    primary, backup = FakeTranslator(error=Exception('down')), FakeTranslator('b:')
+    translator = hedged({'primary': primary, 'backup': backup}, delay_ms=1000)
+    start = time.monotonic()
+    assert translator.translate(ZH, EN, ['a']) == ['b:a']
+    assert time.monotonic() - start < 0.5
+    assert translator.stats()['backends']['primary']['errors'] == 1
+
+
+def test_wrong_result_count_falls_back():
+    class Short(FakeTranslator):
+        def translate(self, from_lang, to_lang, queries):
+            return super().translate(from_lang, to_lang, queries)[:-1]
+
+    translator = hedged({'primary': Short(), 'backup': FakeTranslator('b:')})
+    assert translator.translate(ZH, EN, ['a', 'b']) == ['b:a', 'b:b']
+
+
+def test_all_backends_fail():
+    translator = hedged({'primary': FakeTranslator(error=ValueError('p')),
+                         'backup': FakeTranslator(error=ValueError('b'))})
+    with pytest.raises(ValueError):
+        translator.translate(ZH, EN, ['a'])
+
+
+def test_route_per_language_pair():
+    primary, backup = FakeTranslator('p:'), FakeTranslator('b:')
+    translator = hedged({'primary': primary, 'backup': backup}, 'zh-jp:backup;*:primary')
+    assert translator.translate(ZH, JP, ['a']) == ['b:a']
+    assert translator.translate(ZH, EN, ['a']) == ['p:a']
+
+
+def test_hedge_delay_from_p90():
+    primary = FakeTranslator('p:', delay=0.01)
+    translator = hedged({'primary': primary, 'backup': FakeTranslator()}, delay_ms=1000)
+    assert translator.hedge_delay('primary') == 1
+    for _ in range(5):
+        translator.translate(ZH, EN, ['a'])
+    assert translator.hedge_delay('primary') < 0.1
+
+
+def test_create_backends(monkeypatch):
+    created = []
+
+    def factory(prefix):
+        def create():
+            created.append(prefix)
+            return FakeTranslator(prefix)
+        return create
+
+    monkeypatch.setattr(hedged_module, 'BACKENDS', {})
+    backend_register('primary', factory('p:'))
+    backend_register('backup', factory('b:'))
+    backend_register('unused', factory('u:'))
+    routes = parse_routes('zh-en:primary,backup;*:primary')
+    backends = create_backends(routes)
+    # 每个后端只创建一次, 没有用到的后端不创建
+    assert sorted(backends) == ['backup', 'primary']
+    assert sorted(created) == ['b:', 'p:']
+    assert HedgedTranslator(backends, routes).translate(ZH, JP, ['a']) == ['p:a']
+
+
+def test_create_unknown_backend(monkeypatch):
+    monkeypatch.setattr(hedged_module, 'BACKENDS', {})
+    with pytest.raises(Exception, match='unknown translate backend: missing'):
+        create_backends(parse_routes('*:missing'))
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from server import const
+from server.base import Context
+from server.job import JobManager, JobQueueFull, JobStatus
+
+
+def context(task_uid):
+    return Context(task_uid, 'test', None)
+
+
+def wait(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timeout"
+        time.sleep(0.01)
+
+
+def test_result_dir_not_served():
+    assert not JobManager(workers=0).result_dir.startswith(const.UPLOADS_DIR)
+
+
+def test_queue_full(tmp_path):
+    manager = JobManager(workers=0, queue_size=2, result_dir=str(tmp_path))
+    manager.submit(context('a'), lambda ctx: None)
+    manager.submit(context('b'), lambda ctx: None)
+    with pytest.raises(JobQueueFull):
+        manager.submit(context('c'), lambda ctx: None)
+    assert manager.pending() == 2
+    assert manager.get('a')['status'] == 'pending'
+    assert manager.get('c') is None
+
+
+def test_status_transitions(tmp_path):
+    manager = JobManager(workers=1, result_dir=str(tmp_path))
+    started, release = threading.Event(), threading.Event()
+
+    def fn(ctx, value):
+        started.set()
+        release.wait(5)
+        return {"value": value}
+
+    job = manager.submit(context('a'), fn, 1)
+    started.wait(5)
+    assert manager.get('a')['status'] == JobStatus.RUNNING.value
+    release.set()
+    wait(lambda: job.status == JobStatus.SUCCESS)
+
+    data = manager.get('a')
+    assert data['result'] == {"value": 1}
+    assert data['started_at'] <= data['finished_at']
+
+
+def test_failed(tmp_path):
+    manager = JobManager(workers=1, result_dir=str(tmp_path))
+
+    def fn(ctx):
+        raise ValueError("boom")
+
+    job = manager.submit(context('a'), fn)
+    wait(lambda: job.finished_at is not None)
+    data = manager.get('a')
+    assert data['status'] == JobStatus.FAILED.value
+    assert data['error'] == "boom"
+    assert 'result' not in data
+
+
+def test_evicted_jobs_read_from_file(tmp_path):
+    manager = JobManager(workers=1, keep_finished=1, result_dir=str(tmp_path))
+    first = manager.submit(context('a'), lambda ctx: {"value": 'a'})
+    second = manager.submit(context('b'), lambda ctx: {"value": 'b'})
+    wait(lambda: second.finished_at is not None and 'b' in manager.finished)
+
+    assert list(manager.jobs) == ['b']
+    assert first.status == JobStatus.SUCCESS
+    assert (tmp_path / 'a' / 'result.json').exists()
+    assert manager.get('a')['result'] == {"value": 'a'}
+    assert manager.get('b')['result'] == {"value": 'b'}
+
+
+def test_unknown_or_invalid_task_uid(tmp_path):
+    (tmp_path / 'result.json').write_text('{}')
+    manager = JobManager(workers=0, result_dir=str(tmp_path / 'jobs'))
+    assert manager.get('missing') is None
+    assert manager.get('..') is None
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+
+from server.common.limits import Admission, CircuitBreaker, CircuitOpen, Overloaded, StageLimits, TokenBucket
+
+
+def test_token_bucket_reserve():
+    bucket = TokenBucket(10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # 令牌用完后按 rate 排队
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.02)
+
+
+def test_token_bucket_unlimited():
+    bucket = TokenBucket(0)
+    assert all(bucket.reserve() == 0 for _ in range(100))
+
+
+def test_breaker_opens_after_failures():
+    breaker = CircuitBreaker('test', failures=2, reset_timeout=10)
+    breaker.failure()
+    assert breaker.state == 'closed'
+    breaker.failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpen) as e:
+        breaker.check()
+    assert e.value.retry_after >= 1
+
+
+def test_breaker_single_probe():
+    breaker = CircuitBreaker('test', failures=1, reset_timeout=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    probe = breaker.check()
+    assert probe
+    # 试探期间其它调用直接失败
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    breaker.success()
+    breaker.release(probe)
+    assert breaker.state == 'closed'
+    assert breaker.check() == 0
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker('test', failures=1, reset_timeout=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    probe = breaker.check()
+    breaker.failure()
+    breaker.release(probe)
+    assert breaker.state == 'open'
+
+
+def test_breaker_released_probe():
+    breaker = CircuitBreaker('test', failures=1, reset_timeout=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    # 试探调用没有结果就结束了, 下一次调用可以重新试探
+    breaker.release(breaker.check())
+    assert breaker.state == 'half_open'
+    assert breaker.check()
+
+
+def test_breaker_stale_release():
+    breaker = CircuitBreaker('test', failures=1, reset_timeout=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    first = breaker.check()
+    breaker.failure()
+    time.sleep(0.06)
+    second = breaker.check()
+    # 上一次的试探调用不能释放新的试探
+    breaker.release(first)
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    breaker.release(second)
+
+
+def test_admission_rejects_when_full():
+    admission = Admission(max_running=2, max_waiting=1, retry_after=7)
+    admission.running, admission.waiting = 2, 0
+    admission.check()
+    admission.waiting = 1
+    with pytest.raises(Overloaded) as e:
+        admission.check()
+    assert e.value.retry_after == 7
+    assert admission.stats()['rejected'] == 1
+
+
+def test_admission_queues_then_rejects():
+    anyio = pytest.importorskip('anyio')
+    admission = Admission(max_running=1, max_waiting=1)
+    results = []
+
+    async def request(name, release):
+        try:
+            async with admission.admit():
+                results.append(f"{name} running")
+                await release.wait()
+        except Overloaded:
+            results.append(f"{name} rejected")
+
+    async def main():
+        release = anyio.Event()
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(request, 'a', release)
+            await anyio.sleep(0.01)
+            tg.start_soon(request, 'b', release)
+            await anyio.sleep(0.01)
+            assert (admission.running, admission.waiting) == (1, 1)
+            await request('c', release)
+            release.set()
+
+    anyio.run(main)
+    assert results == ['a running', 'c rejected', 'b running']
+    assert admission.stats()['running'] == admission.stats()['waiting'] == 0
+
+
+def test_stage_limits():
+    limits = StageLimits({'ocr': 1, 'inpaint': 0})
+    entered, release = threading.Event(), threading.Event()
+    waited = []
+
+    def hold():
+        with limits.slot('ocr'):
+            entered.set()
+            release.wait(2)
+
+    def wait():
+        start = time.monotonic()
+        with limits.slot('ocr'):
+            waited.append(time.monotonic() - start)
+
+    first = threading.Thread(target=hold)
+    first.start()
+    entered.wait(2)
+    assert limits.stats() == {'ocr': {'running': 1, 'limit': 1}}
+    second = threading.Thread(target=wait)
+    second.start()
+    time.sleep(0.05)
+    # 不限制的阶段不等待
+    with limits.slot('inpaint'):
+        pass
+    release.set()
+    first.join()
+    second.join()
+    assert waited[0] >= 0.04
+    assert limits.stats() == {'ocr': {'running': 0, 'limit': 1}}
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('httpx')
+from fastapi.testclient import TestClient  # noqa: E402
+
+from server import main  # noqa: E402
+from server.common.limits import Admission, CircuitOpen  # noqa: E402
+from server.job import JobManager  # noqa: E402
+
+PIC_TRANS = {"from_lan": "zh", "to_lan": "en", "image_url": "http://127.0.0.1/a.jpg"}
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_overloaded_returns_429(client, monkeypatch):
+    monkeypatch.setattr(main, 'admission', Admission(max_running=0, max_waiting=0, retry_after=7))
+    response = client.post('/pic_trans', json=PIC_TRANS)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '7'
+    assert main.admission.stats()['rejected'] == 1
+
+
+def test_stream_overloaded_returns_429(client, monkeypatch):
+    monkeypatch.setattr(main, 'admission', Admission(max_running=0, max_waiting=0, retry_after=7))
+    monkeypatch.setattr(main.task_processor, 'get_provider', lambda from_lan, to_lan: None)
+    response = client.post('/pic_trans/stream', json=PIC_TRANS)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '7'
+
+
+def test_job_queue_full_returns_503(client, monkeypatch):
+    monkeypatch.setattr(main, 'job_manager', JobManager(workers=0, queue_size=1))
+    assert client.post('/pic_trans', json=dict(PIC_TRANS, async_mode=True)).status_code == 200
+    response = client.post('/pic_trans', json=dict(PIC_TRANS, async_mode=True))
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(main.const.RETRY_AFTER)
+
+
+def test_circuit_open_returns_503(client, monkeypatch):
+    def run(ctx, task_input):
+        raise CircuitOpen("baidu is unavailable, circuit open", 3)
+
+    monkeypatch.setattr(main, 'admission', Admission(max_running=1, max_waiting=0))
+    monkeypatch.setattr(main.task_processor, 'run', run)
+    response = client.post('/pic_trans', json=PIC_TRANS)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    # 请求结束后释放并发名额
+    assert main.admission.stats()['running'] == 0
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from server.ocr import registry as registry_module
+from server.ocr.registry import ModelRegistry
+
+
+@pytest.fixture(autouse=True)
+def no_rss(monkeypatch):
+    # 无法获取 RSS 时每个模型按 default_mb 计算
+    monkeypatch.setattr(registry_module, 'current_rss', lambda: -1)
+
+
+def load(registry, name, pinned=False):
+    return registry.get(name, lambda: f"model:{name}", pinned=pinned)
+
+
+def test_loads_once():
+    registry = ModelRegistry(budget_mb=10, default_mb=1)
+    calls = []
+    for _ in range(3):
+        assert registry.get('a', lambda: calls.append(1) or 'model:a') == 'model:a'
+    assert calls == [1]
+    assert registry.stats()['loads'] == 1
+
+
+def test_evicts_least_recently_used():
+    registry = ModelRegistry(budget_mb=2, default_mb=1)
+    load(registry, 'a')
+    load(registry, 'b')
+    load(registry, 'a')
+    load(registry, 'c')
+    assert registry.loaded() == ['a', 'c']
+    load(registry, 'd')
+    assert registry.loaded() == ['c', 'd']
+
+    stats = registry.stats()
+    assert stats['loads'] == 4
+    assert stats['evictions'] == 2
+    assert stats['size_mb'] == 2
+    assert stats['models'] == {'c': 1, 'd': 1}
+
+
+def test_pinned_never_evicted():
+    registry = ModelRegistry(budget_mb=2, default_mb=1)
+    load(registry, 'det', pinned=True)
+    for name in ['a', 'b', 'c', 'd']:
+        load(registry, name)
+    assert registry.loaded() == ['det', 'd']
+    assert registry.stats()['evictions'] == 3
+
+
+def test_over_budget_keeps_new_model():
+    # 全是 pinned 时超出预算也保留刚加载的模型
+    registry = ModelRegistry(budget_mb=1, default_mb=1)
+    load(registry, 'det', pinned=True)
+    load(registry, 'cls', pinned=True)
+    load(registry, 'a')
+    assert registry.loaded() == ['det', 'cls', 'a']
+    assert registry.stats()['evictions'] == 0
+
+
+def test_evicted_model_reloaded():
+    registry = ModelRegistry(budget_mb=1, default_mb=1)
+    load(registry, 'a')
+    load(registry, 'b')
+    load(registry, 'a')
+    assert registry.loaded() == ['a']
+    assert registry.stats()['loads'] == 3
+    assert registry.stats()['evictions'] == 2
+
+
+def test_loads_serialized(monkeypatch):
+    # 并发加载不同模型时依次执行, 每个模型的 RSS 差值只包含自己
+    rss = [0]
+    monkeypatch.setattr(registry_module, 'current_rss', lambda: rss[0])
+    registry = ModelRegistry(budget_mb=0, default_mb=1)
+    active, overlapped = [0], []
+
+    def loader(name, mb):
+        def inner():
+            active[0] += 1
+            overlapped.append(active[0] > 1)
+            time.sleep(0.05)
+            rss[0] += mb * 1024 * 1024
+            active[0] -= 1
+            return name
+        return inner
+
+    threads = [threading.Thread(target=registry.get, args=(name, loader(name, mb))) for name, mb in [('a', 3), ('b', 5)]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlapped == [False, False]
+    assert registry.stats()['models'] == {'a': 3, 'b': 5}
+    assert registry.stats()['size_mb'] == 8
@@ -0,0 +1,95 @@
+import numpy as np
+
+from server.base import Language
+from server.common.cache import LRUCache
+from server.ocr.cache import CachedOcr
+from tests.fakes import FakeOcr
+
+ZH, EN = Language.CHINESE, Language.ENGLISH
+
+
+def image(width, height, value=255):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (3, 1, 1)
+
+
+def test_lru_cache_disabled():
+    cache = LRUCache(0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+
+
+def test_cached_ocr(tmp_path):
+    inner = FakeOcr()
+    ocr = CachedOcr(inner, disk_dir=str(tmp_path))
+    first = ocr.ocr(image(100, 20), ZH)
+    second = ocr.ocr(image(100, 20), ZH)
+    assert inner.calls == [1]
+    assert [box.text for box in second] == ['100x20']
+    # 每次返回新的文字框, 修改不影响缓存
+    assert second[0] is not first[0]
+    second[0].ocr_box[0][0] = 0
+    assert ocr.ocr(image(100, 20), ZH)[0].ocr_box[0][0] == 10
+
+
+def test_cache_key():
+    inner = FakeOcr()
+    ocr = CachedOcr(inner, disk_dir=None)
+    ocr.ocr(image(100, 20), ZH)
+    ocr.ocr(image(100, 20, 0), ZH)
+    ocr.ocr(image(100, 20), EN)
+    ocr.ocr(image(100, 20), ZH, threshold=0.5)
+    assert inner.calls == [1, 1, 1, 1]
+
+
+def test_disk_tier(tmp_path):
+    CachedOcr(FakeOcr(), disk_dir=str(tmp_path)).ocr(image(100, 20), ZH)
+    inner = FakeOcr()
+    ocr = CachedOcr(inner, disk_dir=str(tmp_path))
+    assert [box.text for box in ocr.ocr(image(100, 20), ZH)] == ['100x20']
+    assert inner.calls == []
+    assert ocr.stats()['disk']['hits'] == 1
+
+
+def test_batch_only_misses(tmp_path):
+    inner = FakeOcr()
+    ocr = CachedOcr(inner, disk_dir=None)
+    ocr.ocr(image(200, 20), ZH)
+    results = ocr.ocr_batch([image(100, 20), image(200, 20), image(300, 20)], ZH)
+    assert [[box.text for box in boxes] for boxes in results] == [['100x20'], ['200x20'], ['300x20']]
+    assert inner.calls == [1, 2]
+
+
+def test_backends_do_not_share_entries(tmp_path):
+    CachedOcr(FakeOcr(version=1), disk_dir=str(tmp_path)).ocr(image(100, 20), ZH)
+    # 换了 ocr 实现或参数后不使用旧的结果
+    inner = FakeOcr(version=2)
+    CachedOcr(inner, disk_dir=str(tmp_path)).ocr(image(100, 20), ZH)
+    assert inner.calls == [1]
+
+    class OtherOcr(FakeOcr):
+        pass
+
+    other = OtherOcr()
+    CachedOcr(other, disk_dir=str(tmp_path)).ocr(image(100, 20), ZH)
+    assert other.calls == [1]
+
+
+def test_key_uses_innermost_backend():
+    from server.ocr.batching import BatchingOcr
+    from server.ocr.tiled import TiledOcr
+
+    first = CachedOcr(TiledOcr(BatchingOcr(FakeOcr(version=1))), disk_dir=None)
+    second = CachedOcr(TiledOcr(BatchingOcr(FakeOcr(version=2))), disk_dir=None)
+    assert first.key(image(100, 20), ZH, 0.85) != second.key(image(100, 20), ZH, 0.85)
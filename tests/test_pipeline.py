@@ -0,0 +1,77 @@
+import threading
+import time
+
+from server.common.pipeline import run_pipeline
+
+
+def collect(values, stages, queue_size=2):
+    done = []
+    run_pipeline(values, stages, done.append, queue_size=queue_size)
+    return done
+
+
+def test_values_pass_through_stages():
+    done = collect(range(5), [('add', lambda v: v + 1, 1), ('double', lambda v: v * 2, 1)])
+    assert sorted((item.index, item.value) for item in done) == [(i, (i + 1) * 2) for i in range(5)]
+    assert all(item.error is None for item in done)
+
+
+def test_single_worker_keeps_order():
+    done = collect(range(20), [('a', lambda v: v, 1), ('b', lambda v: v, 1)])
+    assert [item.index for item in done] == list(range(20))
+
+
+def test_multiple_workers_may_reorder():
+    # 多个线程时完成顺序不保证, 由 index 对应回输入
+    def slow_first(v):
+        time.sleep(0.1 if v == 0 else 0)
+        return v
+
+    done = collect(range(4), [('slow', slow_first, 2)])
+    assert sorted(item.index for item in done) == [0, 1, 2, 3]
+    assert done[-1].index == 0
+    assert all(item.value == item.index for item in done)
+
+
+def test_error_skips_later_stages():
+    calls = []
+
+    def fail_on_two(v):
+        if v == 2:
+            raise ValueError(f"bad {v}")
+        return v
+
+    def record(v):
+        calls.append(v)
+        return v
+
+    done = collect(range(4), [('check', fail_on_two, 1), ('record', record, 1)])
+    errors = {item.index: item.error for item in done if item.error is not None}
+    assert list(errors) == [2]
+    assert isinstance(errors[2], ValueError) and str(errors[2]) == "bad 2"
+    assert calls == [0, 1, 3]
+    assert len(done) == 4
+
+
+def test_stages_overlap():
+    # 第二个元素的第一阶段和第一个元素的第二阶段同时执行
+    first_in_second = threading.Event()
+    overlapped = []
+
+    def stage1(v):
+        if v == 1:
+            overlapped.append(first_in_second.wait(2))
+        return v
+
+    def stage2(v):
+        if v == 0:
+            first_in_second.set()
+            time.sleep(0.05)
+        return v
+
+    collect(range(2), [('s1', stage1, 1), ('s2', stage2, 1)])
+    assert overlapped == [True]
+
+
+def test_empty_input():
+    assert collect([], [('a', lambda v: v, 2)]) == []
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from server.common.singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, n):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_execute_once():
+    flight = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"image_url": "x"}
+
+    results, errors = run_concurrently(flight, 'k', fn, 5)
+    assert len(calls) == 1
+    assert errors == []
+    assert len(results) == 5 and all(result is results[0] for result in results)
+    stats = flight.stats()
+    assert (stats['executed'], stats['coalesced'], stats['in_flight']) == (1, 4, 0)
+
+
+def test_error_shared_by_waiters():
+    flight = SingleFlight()
+
+    def fn():
+        time.sleep(0.1)
+        raise ValueError('failed')
+
+    results, errors = run_concurrently(flight, 'k', fn, 3)
+    assert results == []
+    assert len(errors) == 3 and all(isinstance(e, ValueError) for e in errors)
+
+
+def test_finished_call_not_reused():
+    flight = SingleFlight()
+    assert flight.do('k', lambda: 1) == 1
+    assert flight.do('k', lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do('k', lambda: int('x'))
+    assert flight.do('k', lambda: 3) == 3
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert [flight.do(key, lambda k=key: k) for key in 'ab'] == ['a', 'b']
+    assert flight.stats()['coalesced'] == 0
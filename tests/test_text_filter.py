@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from server.bench.text_filter import CORPUS, KNOWN_DIFFERENCES, reference
+from server.text.filter import classify, is_non_translatable
+
+
+@pytest.mark.parametrize('text, kind', [
+    ('123', 'number'), ('1,234', 'currency'), (' 42 ', 'number'), ('１２３', 'number'),
+    ('500g', 'weight'), ('1.5kg', 'weight'), ('2 lbs', 'weight'), ('5kg*2', 'weight'), ('2kgs', ''),
+    ('¥ 99.00', 'currency'), ('100元', 'currency'), ('USD 20', 'currency'),
+    ('30cm', 'length'), ('5 inch', 'length'),
+    ('(5kg)', 'weight'), ('5kg+2kg', 'weight'), ('5**2kg', 'weight'), ('2^3kg', 'weight'), ('(5kg)*2', 'weight'),
+    ('1 μg', 'weight'), ('1 µg', 'weight'), ('5 mt', 'weight'), ('1 dwt', 'weight'), ('3 pennyweight', 'weight'),
+    ('1 dalton', 'weight'), ('1 electron_mass', 'weight'), ('1 m_e', 'weight'), ('2/t', ''), ('3 mts', ''),
+    ('限时特惠', ''), ('净含量 500g', ''), ('gmail', ''), ('', ''),
+])
+def test_classify(text, kind):
+    assert classify(text) == kind
+
+
+def test_length_is_translated():
+    assert not is_non_translatable('30cm')
+
+
+def test_matches_pint_reference():
+    pytest.importorskip('pint')
+    assert [text for text in CORPUS if is_non_translatable(text) != reference(text)] == []
+
+
+@pytest.mark.parametrize('text', KNOWN_DIFFERENCES)
+def test_known_differences_are_translated(text):
+    # pint 认为是重量, 但这些写法有意按需要翻译的文字处理
+    assert not is_non_translatable(text)
+
+
+def test_no_catastrophic_backtracking():
+    start = time.perf_counter()
+    for text in ['1' * 30 + 'x', '1.' * 500 + 'x', '5kg*' * 200 + 'x', '(' + '1*' * 300 + 'kg']:
+        classify.__wrapped__(text)
+    assert time.perf_counter() - start < 0.5
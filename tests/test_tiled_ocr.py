@@ -0,0 +1,89 @@
+import numpy as np
+
+from server.base import Language, PicTransOcrBox
+from server.ocr.tiled import TiledOcr, _TileBox, merge_text, tile_starts
+from tests.fakes import FakeOcr
+
+ZH = Language.CHINESE
+
+
+def tile_box(rect, text, cut):
+    left, top, right, bottom = rect
+    box = PicTransOcrBox(ZH)
+    box.ocr_box = [[left, top], [right, top], [right, bottom], [left, bottom]]
+    box.text = text
+    return _TileBox(box, cut)
+
+
+def test_tile_starts():
+    assert tile_starts(500, 1000, 100) == [0]
+    assert tile_starts(2500, 1000, 100) == [0, 900, 1500]
+    assert tile_starts(1000, 1000, 100) == [0]
+
+
+def test_merge_text():
+    assert merge_text('hello wor', 'world') == 'hello world'
+    assert merge_text('abc', 'def') == 'abcdef'
+
+
+def test_need_tile():
+    ocr = TiledOcr(FakeOcr(), tile_size=1000, overlap=100, ratio=3)
+    assert not ocr.need_tile(np.zeros((900, 300, 3), np.uint8))
+    assert not ocr.need_tile(np.zeros((2000, 1000, 3), np.uint8))
+    assert ocr.need_tile(np.zeros((3000, 500, 3), np.uint8))
+
+
+def test_merge_keeps_uncut_box():
+    ocr = TiledOcr(FakeOcr(), tile_size=1000, overlap=100)
+    boxes = ocr.merge([
+        tile_box((10, 980, 200, 998), '被切断', True),
+        tile_box((10, 975, 200, 1010), '完整的一行', False),
+        tile_box((10, 500, 200, 520), '其它', False),
+    ])
+    assert [box.text for box in boxes] == ['其它', '完整的一行']
+
+
+def test_merge_two_cut_boxes():
+    ocr = TiledOcr(FakeOcr(), tile_size=1000, overlap=100)
+    boxes = ocr.merge([
+        tile_box((100, 950, 400, 999), 'hello wor', True),
+        tile_box((100, 955, 420, 1000), 'world', True),
+    ])
+    assert len(boxes) == 1
+    assert boxes[0].text == 'hello world'
+    assert boxes[0].ocr_box[0] == [100, 950] and boxes[0].ocr_box[2] == [420, 1000]
+
+
+def test_ocr_offsets_boxes():
+    ocr = TiledOcr(FakeOcr(), tile_size=1000, overlap=100, ratio=3)
+    boxes = ocr.ocr(np.zeros((2500, 500, 3), np.uint8), ZH)
+    assert sorted(box.ocr_box[0][1] for box in boxes) == [10, 910, 1510]
+
+
+def test_ocr_batch_single_inner_batch():
+    inner = FakeOcr()
+    ocr = TiledOcr(inner, tile_size=1000, overlap=100, ratio=3)
+    images = [np.zeros((200, 200, 3), np.uint8), np.zeros((2500, 500, 3), np.uint8),
+              np.zeros((300, 300, 3), np.uint8)]
+    results = ocr.ocr_batch(images, ZH)
+    # 两张小图和长图的三个切片一起识别
+    assert inner.calls == [5]
+    assert [box.text for box in results[0]] == ['200x200']
+    assert sorted(box.ocr_box[0][1] for box in results[1]) == [10, 910, 1510]
+    assert [box.text for box in results[2]] == ['300x300']
+
+
+def test_ocr_batch_without_tiles():
+    inner = FakeOcr()
+    ocr = TiledOcr(inner, tile_size=1000, overlap=100, ratio=3)
+    results = ocr.ocr_batch([np.zeros((200, 200, 3), np.uint8)] * 2, ZH)
+    assert inner.calls == [2]
+    assert len(results) == 2
+
+
+def test_cache_id_includes_tile_settings():
+    inner = FakeOcr()
+    ids = {TiledOcr(inner, tile_size=size, overlap=overlap, ratio=ratio).cache_id()
+           for size, overlap, ratio in [(1000, 100, 3), (2000, 100, 3), (1000, 200, 3), (1000, 100, 4)]}
+    assert len(ids) == 4
+    assert TiledOcr(inner, tile_size=1000, overlap=100, ratio=3).cache_id().endswith(inner.cache_id())
@@ -0,0 +1,85 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from server.base import Language
+from server.translate.batching import BatchingTranslator
+from tests.fakes import FakeTranslator
+
+ZH, EN, JP = Language.CHINESE, Language.ENGLISH, Language.JAPANESE
+
+
+def run_concurrently(translator, calls):
+    """
+    同时发出多个调用, calls: [(from_lang, to_lang, queries)]
+    """
+    barrier = threading.Barrier(len(calls))
+
+    def call(args):
+        barrier.wait()
+        return translator.translate(*args)
+
+    with ThreadPoolExecutor(len(calls)) as executor:
+        return list(executor.map(call, calls))
+
+
+def test_concurrent_calls_share_one_request():
+    upstream = FakeTranslator()
+    translator = BatchingTranslator(upstream, window_ms=100)
+    results = run_concurrently(translator, [(ZH, EN, ['a', 'b']), (ZH, EN, ['c']), (ZH, EN, ['b', 'd', 'a'])])
+    assert results == [['>a', '>b'], ['>c'], ['>b', '>d', '>a']]
+    assert len(upstream.calls) == 1
+    # 相同的文字只翻译一次
+    assert sorted(upstream.calls[0]) == ['a', 'b', 'c', 'd']
+    stats = translator.stats()
+    assert (stats['batches'], stats['queries'], stats['upstream_queries']) == (1, 6, 4)
+
+
+def test_language_pairs_are_batched_separately():
+    upstream = FakeTranslator()
+    translator = BatchingTranslator(upstream, window_ms=100)
+    results = run_concurrently(translator, [(ZH, EN, ['a']), (ZH, JP, ['a']), (ZH, EN, ['b'])])
+    assert results == [['>a'], ['>a'], ['>b']]
+    assert sorted(sorted(call) for call in upstream.calls) == [['a'], ['a', 'b']]
+
+
+def test_full_batch_sent_without_waiting():
+    upstream = FakeTranslator()
+    translator = BatchingTranslator(upstream, window_ms=10000, max_queries=2)
+    assert translator.translate(ZH, EN, ['a', 'b']) == ['>a', '>b']
+
+
+def test_error_fans_out_to_every_caller():
+    translator = BatchingTranslator(FakeTranslator(error=ValueError('down')), window_ms=100)
+    errors = []
+
+    def call(queries):
+        try:
+            translator.translate(ZH, EN, queries)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=([text],)) for text in 'abc']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    assert errors[0] is errors[1] is errors[2]
+
+
+def test_wrong_result_count():
+    class Short(FakeTranslator):
+        def translate(self, from_lang, to_lang, queries):
+            return super().translate(from_lang, to_lang, queries)[1:]
+
+    translator = BatchingTranslator(Short(), window_ms=1)
+    with pytest.raises(Exception, match='returned 1 results for 2 queries'):
+        translator.translate(ZH, EN, ['a', 'b'])
+
+
+def test_empty():
+    upstream = FakeTranslator()
+    assert BatchingTranslator(upstream, window_ms=1).translate(ZH, EN, []) == []
+    assert upstream.calls == []
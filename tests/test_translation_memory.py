@@ -0,0 +1,98 @@
+import os
+import time
+
+import pytest
+
+from server.base import Language
+from server.translate.memory import TranslationMemory, normalize
+from tests.fakes import FakeTranslator
+
+ZH, EN, JP = Language.CHINESE, Language.ENGLISH, Language.JAPANESE
+
+
+@pytest.fixture
+def db(tmp_path):
+    return os.path.join(tmp_path, 'memory', 'translation.db')
+
+
+def test_normalize():
+    assert normalize(' １２３　ＡＢＣ \n') == '123 ABC'
+
+
+def test_only_misses_go_upstream(db):
+    upstream = FakeTranslator()
+    memory = TranslationMemory(upstream, db)
+    assert memory.translate(ZH, EN, ['a', 'b']) == ['>a', '>b']
+    assert memory.translate(ZH, EN, ['b', 'c', 'a']) == ['>b', '>c', '>a']
+    assert upstream.calls == [['a', 'b'], ['c']]
+    stats = memory.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 3, 3)
+
+
+def test_dedupe_and_order(db):
+    upstream = FakeTranslator()
+    memory = TranslationMemory(upstream, db)
+    assert memory.translate(ZH, EN, ['x', 'y', 'x', ' ', 'y']) == ['>x', '>y', '>x', ' ', '>y']
+    assert upstream.calls == [['x', 'y']]
+
+
+def test_sends_original_text_upstream(db):
+    upstream = FakeTranslator()
+    memory = TranslationMemory(upstream, db)
+    # 归一化后相同的文字共用一条记录, 上游翻译第一次出现的原文
+    assert memory.translate(ZH, EN, ['第一行\n第二行', '第一行 第二行', '１２３！']) \
+        == ['>第一行\n第二行', '>第一行\n第二行', '>１２３！']
+    assert upstream.calls == [['第一行\n第二行', '１２３！']]
+    assert memory.translate(ZH, EN, ['123!']) == ['>１２３！']
+
+
+def test_language_pairs_are_separate(db):
+    upstream = FakeTranslator()
+    memory = TranslationMemory(upstream, db)
+    memory.translate(ZH, EN, ['a'])
+    memory.translate(ZH, JP, ['a'])
+    assert upstream.calls == [['a'], ['a']]
+
+
+def test_persistent(db):
+    TranslationMemory(FakeTranslator('old:'), db).translate(ZH, EN, ['a'])
+    upstream = FakeTranslator()
+    assert TranslationMemory(upstream, db).translate(ZH, EN, ['a']) == ['old:a']
+    assert upstream.calls == []
+
+
+def test_ttl(db):
+    upstream = FakeTranslator()
+    memory = TranslationMemory(upstream, db, ttl=1)
+    memory.translate(ZH, EN, ['a'])
+    time.sleep(1.1)
+    memory.translate(ZH, EN, ['a'])
+    assert upstream.calls == [['a'], ['a']]
+
+
+def test_evict_least_recently_used(db):
+    memory = TranslationMemory(FakeTranslator(), db, max_entries=3, ttl=0)
+    memory.translate(ZH, EN, ['a', 'b', 'c'])
+    time.sleep(0.01)
+    memory.translate(ZH, EN, ['a'])
+    time.sleep(0.01)
+    memory.translate(ZH, EN, ['d'])
+    memory.evict()
+    rows = memory.conn().execute('SELECT text FROM memory ORDER BY text').fetchall()
+    assert [row[0] for row in rows] == ['a', 'c', 'd']
+
+
+def test_upstream_error_not_stored(db):
+    memory = TranslationMemory(FakeTranslator(error=Exception('down')), db)
+    with pytest.raises(Exception, match='down'):
+        memory.translate(ZH, EN, ['a'])
+    assert memory.stats()['entries'] == 0
+
+
+def test_wrong_result_count(db):
+    class Short(FakeTranslator):
+        def translate(self, from_lang, to_lang, queries):
+            return []
+
+    with pytest.raises(Exception, match='returned 0 results'):
+        TranslationMemory(Short(), db).translate(ZH, EN, ['a'])
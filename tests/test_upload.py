@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from server.files.uploader import Uploader
+
+pytest.importorskip('python_multipart')
+from server.files.multipart import BadUpload, MultipartUpload  # noqa: E402
+
+BOUNDARY = 'XyZ'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def body(data: bytes, filename='a.JPG', field='image') -> bytes:
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="other"\r\n\r\nhello\r\n'
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + data + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def upload(uploader, payload: bytes, chunk=65536) -> str:
+    item = MultipartUpload(CONTENT_TYPE, uploader)
+    for i in range(0, len(payload), chunk):
+        item.write(payload[i:i + chunk])
+    return item.finish()
+
+
+def test_stream_to_final_path(tmp_path):
+    uploader = Uploader(str(tmp_path), '/static')
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    url = upload(uploader, body(data))
+    assert url.startswith('/static/images/') and url.endswith('.jpg')
+    with open(os.path.join(tmp_path, url[len('/static/'):]), 'rb') as f:
+        assert f.read() == data
+    # 没有残留的临时文件, 重复上传返回同一个地址
+    assert upload(uploader, body(data), chunk=1000) == url
+    assert os.listdir(os.path.join(tmp_path, 'images')) == [url.rsplit('/', 1)[1]]
+
+
+def test_not_multipart(tmp_path):
+    with pytest.raises(BadUpload):
+        MultipartUpload('application/json', Uploader(str(tmp_path)))
+
+
+def test_missing_field(tmp_path):
+    uploader = Uploader(str(tmp_path))
+    item = MultipartUpload(CONTENT_TYPE, uploader)
+    item.write(body(b'data', field='file'))
+    with pytest.raises(BadUpload, match='missing file field'):
+        item.finish()
+    item.abort()
+    assert os.listdir(os.path.join(tmp_path, 'images')) == []